@@ -0,0 +1,116 @@
+'''
+在电脑 (CPython) 上运行 pymg 的替身环境
+
+import host
+host.install()                  # 使用真实时间，可配合 asyncio
+host.install(simulated=True)    # 使用模拟时钟，time.sleep_ms() 立即返回并推进时间
+
+之后即可 import pymg, pymg_example
+
+install() 会:
+  - 把 host/stubs 加入 sys.path，提供 machine, framebuf, network, ntptime, micropython 等模块
+  - 给 time 模块补上 ticks_ms / ticks_us / ticks_diff / ticks_add / sleep_ms / sleep_us
+  - 提供内置的 const()
+  - 把 '/ntp/main.pbm'、'0.pbm' 这类设备上的路径映射到仓库目录
+
+模拟时钟按 1ms 推进，每推进 1ms 触发一次到期的 machine.Timer，结果与电脑性能无关
+'''
+
+import builtins, os, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUBS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stubs')
+
+# 与 ESP32 相同，ticks 在 2^30 处回绕
+_TICKS_PERIOD = 1 << 30
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = _TICKS_PERIOD >> 1
+
+_installed = False
+_simulated = False
+_clock_us = 0
+_start = time.monotonic()
+
+
+# 启动以来的微秒数，不回绕
+def now_us():
+    if _simulated:
+        return _clock_us
+    return int((time.monotonic() - _start) * 1000000)
+
+
+def ticks_ms():
+    return (now_us() // 1000) & _TICKS_MAX
+
+
+def ticks_us():
+    return now_us() & _TICKS_MAX
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
+
+
+def sleep_ms(ms):
+    sleep_us(ms * 1000)
+
+
+def sleep_us(us):
+    global _clock_us
+    if not _simulated:
+        if us > 0:
+            time.sleep(us / 1000000)
+        _fire_timers()
+        return
+    end = _clock_us + us
+    while _clock_us < end:
+        _clock_us = min(end, (_clock_us // 1000 + 1) * 1000)
+        _fire_timers()
+
+
+def simulated():
+    return _simulated
+
+
+# 推进模拟时钟 ms 毫秒
+def advance(ms):
+    sleep_ms(ms)
+
+
+def _fire_timers():
+    machine = sys.modules.get('machine')
+    if machine is not None:
+        machine.Timer._fire(ticks_ms())
+
+
+_open = builtins.open
+
+
+# 设备上的文件都在根目录下，找不到时到仓库目录中查找
+def _device_open(file, mode='r', *args, **kwargs):
+    if isinstance(file, str) and 'w' not in mode and not os.path.exists(file):
+        file = os.path.join(ROOT, file.lstrip('/'))
+    return _open(file, mode, *args, **kwargs)
+
+
+def install(simulated=False):
+    global _installed, _simulated
+    _simulated = simulated
+    if _installed:
+        return
+    _installed = True
+    for path in (STUBS, ROOT):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    time.ticks_ms = ticks_ms
+    time.ticks_us = ticks_us
+    time.ticks_add = ticks_add
+    time.ticks_diff = ticks_diff
+    time.sleep_ms = sleep_ms
+    time.sleep_us = sleep_us
+    builtins.const = lambda expr: expr
+    builtins.open = _device_open
@@ -0,0 +1,179 @@
+'''
+在电脑上以模拟时钟运行预设场景，统计帧率、每帧内存分配和各控件耗时
+
+python -m host.bench                # 运行全部场景
+python -m host.bench slide roll     # 只运行指定场景
+python -m host.bench -q             # 不打印各控件耗时表
+
+场景:
+  slide    编码器转动 3 格，RotaryPager 滑动切换页面
+  roll     时间从 23:59:58 走到 00:00:00，六位数字同时滚动
+  marquee  亮度页面中宽于控件的 Lable 循环滚动
+  yeelight Yeelight 亮度设置页面中转动编码器调节亮度 (不连接灯泡)
+
+每个场景运行两遍，模拟时钟保证两遍完全相同:
+  第一遍开启 Profiler，统计每次刷新屏幕的 step() 耗时 (含 Profiler 自身开销) 和各控件耗时，单位为电脑上的微秒
+  第二遍用 tracemalloc 统计每次刷新屏幕的 step() 中分配的内存
+不加 -q 时还会打印第一遍中各刷新档位 (有动画 / 空闲) 的时间、帧率和唤醒次数
+CPython 没有累计分配次数，内存分配以一帧内 tracemalloc 峰值超出帧开始时的字节数计
+'''
+
+import host
+
+host.install(simulated=True)
+
+import sys, time, tracemalloc
+from machine import RTC
+from host.sim import Simulator
+
+
+def _slide(sim):
+    sim.encoder.turn(3)
+
+
+def _roll(sim):
+    RTC().datetime((2024, 1, 1, 0, 23, 59, 58, 0))
+
+
+def _marquee_setup(sim):
+    sim.gui.pager.setWidget(1)
+
+
+# 与按键进入 Yeelight 亮度设置页面相同，但跳过 YeelightView.focus() 中的联网和读取灯泡状态
+def _yeelight_setup(sim):
+    pager = sim.gui.pager
+    view = pager.window_4
+    pager.setWidget(pager.getWidgetIndex(view))
+    pager.buttonPassthrough = True
+    pager.rotary.setEnable(False)
+    view.setWidget(view.getWidgetIndex(view.window_2))
+    view.buttonPassthrough = True
+    view.window_2.focus(0)
+
+
+def _yeelight(sim):
+    sim.encoder.turn(6)
+
+
+# 名称: (准备, 开始测量时的操作, 测量时长 ms)
+SCENARIOS = {
+    'slide': (None, _slide, 1500),
+    'roll': (None, _roll, 3000),
+    'marquee': (_marquee_setup, None, 3000),
+    'yeelight': (_yeelight_setup, _yeelight, 1500),
+}
+
+
+class _TimingSimulator(Simulator):
+
+    def __init__(self):
+        super().__init__()
+        self.samples = []
+
+    def step(self):
+        transfer = self.gui.transfer
+        frames = transfer.frames
+        start = time.perf_counter_ns()
+        sleep = super().step()
+        if transfer.frames != frames:
+            self.samples.append((time.perf_counter_ns() - start) // 1000)
+        return sleep
+
+
+class _AllocSimulator(Simulator):
+
+    def __init__(self):
+        super().__init__()
+        self.samples = []
+        self.tracing = False
+
+    def step(self):
+        if not self.tracing:
+            return super().step()
+        transfer = self.gui.transfer
+        frames = transfer.frames
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        sleep = super().step()
+        if transfer.frames != frames:
+            self.samples.append(tracemalloc.get_traced_memory()[1] - base)
+        return sleep
+
+
+# 模拟时钟下计算不耗时，Profiler 改用电脑的真实时间计时
+def _host_ticks_us():
+    return (time.perf_counter_ns() // 1000) & ((1 << 30) - 1)
+
+
+def _profile(gui):
+    ticks_us = time.ticks_us
+    time.ticks_us = _host_ticks_us
+    try:
+        gui.setProfile(True, size=1000)
+    finally:
+        time.ticks_us = ticks_us
+
+
+def _prepare(sim, setup):
+    if setup is not None:
+        setup(sim)
+    # 等待启动时的整屏刷新和页面切换完成
+    sim.run(1000)
+
+
+def _p95(samples):
+    samples = sorted(samples)
+    return samples[(len(samples) * 95 + 99) // 100 - 1]
+
+
+def run(name, verbose=True):
+    setup, action, ms = SCENARIOS[name]
+
+    sim = _TimingSimulator()
+    _prepare(sim, setup)
+    _profile(sim.gui)
+    sim.gui.resetTiers()
+    sim.samples = []
+    frames = sim.gui.transfer.frames
+    if action is not None:
+        action(sim)
+    sim.run(ms)
+    frames = sim.gui.transfer.frames - frames
+    times = sim.samples
+    profiled = sim.gui
+
+    sim = _AllocSimulator()
+    _prepare(sim, setup)
+    tracemalloc.start()
+    sim.tracing = True
+    if action is not None:
+        action(sim)
+    sim.run(ms)
+    sim.tracing = False
+    tracemalloc.stop()
+    allocs = sim.samples
+
+    print('%-8s fps: %5.1f  frames: %4d  us/frame avg: %5d p95: %5d max: %5d  alloc B/frame avg: %5d max: %5d' % (
+        name, frames * 1000 / ms, frames,
+        sum(times) // max(len(times), 1), _p95(times) if times else 0, max(times, default=0),
+        sum(allocs) // max(len(allocs), 1), max(allocs, default=0)))
+    if verbose:
+        profiled.dumpProfile()
+        profiled.tierReport()
+        print()
+
+
+def main(argv):
+    verbose = '-q' not in argv
+    names = [arg for arg in argv if not arg.startswith('-')] or list(SCENARIOS)
+    for name in names:
+        if name not in SCENARIOS:
+            print('unknown scenario: %s (%s)' % (name, ', '.join(SCENARIOS)))
+            return 1
+    for name in names:
+        run(name, verbose)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,166 @@
+'''
+把正交编码的边沿序列高速回放给 RotaryIRQ 的引脚中断，与按格雷码位置计算的步数比较
+
+python -m host.encoder                      # 生成随机序列，每 20us 一个边沿回放
+python -m host.encoder -r 5 edges.txt       # 回放录制的序列，每行一个电平 "CLK DT"，-r 为边沿间隔 us
+python -m host.encoder -o edges.txt         # 保存生成的序列
+
+生成的序列包含连续转动、半格内来回抖动和转动中反向，第一行为静止时的 "1 1"
+每个序列分别以不限范围 / 0-23 循环 / 5-100 限幅三种模式解码 (半步、无加速)
+每 16ms 模拟时间取出一次环形缓冲区，比较最终数值和取出的总步数 (限幅模式下停在边界的步不记录)
+CPython 的整数运算本身会分配内存，中断中不分配内存需在设备上用 pymg_bench.bench_rotary() 验证
+'''
+
+import host
+
+host.install(simulated=True)
+
+import random, sys, time
+from machine import Pin
+from rotary import Rotary
+from rotary_irp_esp import RotaryIRQ
+
+CLK = 32
+DT = 33
+# 顺时针依次经过的 (CLK << 1 | DT) 电平
+GRAY = (3, 1, 0, 2)
+FRAME_US = 16000
+MODES = (
+    ('unbounded', Rotary.RANGE_UNBOUNDED, 0, 0),
+    ('wrap 0-23', Rotary.RANGE_WRAP, 0, 23),
+    ('bound 5-100', Rotary.RANGE_BOUNDED, 5, 100),
+)
+
+
+# 随机生成 count 个边沿，返回电平列表
+def generate(count, seed=1):
+    rnd = random.Random(seed)
+    pos = 0
+    levels = [GRAY[0]]
+    while len(levels) <= count:
+        kind = rnd.random()
+        if kind < 0.2:
+            # 抖动: 走一个边沿再退回
+            moves = [rnd.choice((1, -1))]
+            moves.append(-moves[0])
+        else:
+            moves = [1 if kind < 0.6 else -1] * rnd.randint(1, 40)
+        for move in moves:
+            pos += move
+            levels.append(GRAY[pos % 4])
+    return levels[:count + 1]
+
+
+# 半步解码的期望结果: 从一个静止位置 (11 或 00) 转到相邻的静止位置为一步，返回每一步的方向
+def expected_steps(levels):
+    pos = 0
+    rest = 0
+    steps = []
+    for level in levels[1:]:
+        move = (GRAY.index(level) - pos % 4) % 4
+        if move == 1:
+            pos += 1
+        elif move == 3:
+            pos -= 1
+        else:
+            raise ValueError('edge changes both pins: %d -> %d' % (GRAY[pos % 4], level))
+        if pos == rest + 2:
+            steps.append(1)
+            rest = pos
+        elif pos == rest - 2:
+            steps.append(-1)
+            rest = pos
+    return steps
+
+
+# 返回最终数值和应记录的总步数
+def apply(steps, mode, low, high, value):
+    total = 0
+    for step in steps:
+        old = value
+        value += step
+        if mode == Rotary.RANGE_WRAP:
+            value = low + (value - low) % (high - low + 1)
+        elif mode == Rotary.RANGE_BOUNDED:
+            value = min(high, max(low, value))
+            if value == old:
+                continue
+        total += step
+    return value, total
+
+
+def replay(levels, mode, low, high, rate_us):
+    clk = Pin(CLK, Pin.IN, value=levels[0] >> 1)
+    dt = Pin(DT, Pin.IN, value=levels[0] & 1)
+    start = low if mode != Rotary.RANGE_UNBOUNDED else 0
+    encoder = RotaryIRQ(CLK, DT, min_val=low, max_val=high, range_mode=mode, half_step=True)
+    encoder.setValue(start)
+    deltas = encoder._ev_delta[:]
+    times = encoder._ev_time[:]
+    total = 0
+    frame = 0
+    last = levels[0]
+    for level in levels[1:]:
+        if (level ^ last) & 2:
+            clk.value(level >> 1)
+        else:
+            dt.value(level & 1)
+        last = level
+        time.sleep_us(rate_us)
+        frame += rate_us
+        if frame >= FRAME_US:
+            frame = 0
+            count = encoder.read(deltas, times)
+            for i in range(0, count):
+                total += deltas[i]
+    count = encoder.read(deltas, times)
+    for i in range(0, count):
+        total += deltas[i]
+    encoder.close()
+    return encoder.value(), total, encoder.overflows
+
+
+def load(path):
+    levels = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                clk, dt = line.split()
+                levels.append(int(clk) << 1 | int(dt))
+    return levels
+
+
+def main(argv):
+    rate = 20
+    out = None
+    path = None
+    args = list(argv)
+    while args:
+        arg = args.pop(0)
+        if arg == '-r':
+            rate = int(args.pop(0))
+        elif arg == '-o':
+            out = args.pop(0)
+        else:
+            path = arg
+    levels = load(path) if path else generate(20000)
+    if out:
+        with open(out, 'w') as f:
+            for level in levels:
+                f.write('%d %d\n' % (level >> 1, level & 1))
+    steps = expected_steps(levels)
+    print('%d edges, %d steps (net %+d), %dus per edge' % (len(levels) - 1, len(steps), sum(steps), rate))
+    failed = 0
+    for name, mode, low, high in MODES:
+        start = low if mode != Rotary.RANGE_UNBOUNDED else 0
+        want, want_total = apply(steps, mode, low, high, start)
+        value, total, overflows = replay(levels, mode, low, high, rate)
+        ok = value == want and total == want_total
+        failed += not ok
+        print('%-12s value: %6d expected: %6d  steps: %+6d  ring overflows: %5d  %s' % (
+            name, value, want, total, overflows, 'ok' if ok else 'FAIL'))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
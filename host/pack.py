@@ -0,0 +1,121 @@
+'''
+把仓库中的 .pbm 图片打包为 pymg 资源包，上传到设备根目录后由 main.py 中的 loadBundle() 读取
+
+python -m host.pack                 # 生成 assets.bin
+python -m host.pack out.bin
+python -m host.pack --check        # 检查损坏或旧版本的资源包不会中断启动，而是改为读取 .pbm 文件
+
+格式见 pymg.PbmBundle，图片数据预先转换为屏幕的 MONO_VLSB 格式，设备上读取后不需要再转换
+'''
+
+import os, struct, sys, tempfile
+import host
+
+MAGIC = b'PBMB'
+VERSION = 1
+HEADER = '<4sHHI'
+ENTRY = '<HHIIB'
+MONO_VLSB = 0
+
+
+def read_pbm(path):
+    with open(path, 'rb') as f:
+        if f.readline().strip() != b'P4':
+            raise ValueError('%s is not a P4 pbm' % path)
+        w = int(f.readline())
+        h = int(f.readline())
+        data = f.read()
+    return w, h, data
+
+
+# P4 数据为每行按字节对齐、高位在左 (MONO_HLSB)，转换为每 8 行一页、低位在上 (MONO_VLSB)
+def to_vlsb(w, h, data):
+    stride = (w + 7) // 8
+    out = bytearray(w * ((h + 7) // 8))
+    for y in range(h):
+        for x in range(w):
+            if data[y * stride + (x >> 3)] & (0x80 >> (x & 7)):
+                out[(y >> 3) * w + x] |= 1 << (y & 7)
+    return bytes(out)
+
+
+# 查找 root 下的 .pbm 文件，返回设备上的路径 (相对根目录，不含开头的 '/')
+def find_pbms(root=host.ROOT):
+    names = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.') and d not in ('host', '__pycache__'))
+        for filename in sorted(filenames):
+            if filename.endswith('.pbm'):
+                names.append(os.path.relpath(os.path.join(dirpath, filename), root).replace(os.sep, '/'))
+    return names
+
+
+def pack(out, root=host.ROOT, names=None):
+    if names is None:
+        names = find_pbms(root)
+    images = []
+    for name in names:
+        w, h, data = read_pbm(os.path.join(root, name))
+        images.append((name.encode(), w, h, to_vlsb(w, h, data)))
+    # 图片数据紧接在索引之后
+    offset = struct.calcsize(HEADER) + sum(1 + len(name) + struct.calcsize(ENTRY) for name, w, h, data in images)
+    index = b''
+    for name, w, h, data in images:
+        index += struct.pack('B', len(name)) + name + struct.pack(ENTRY, w, h, offset, len(data), MONO_VLSB)
+        offset += len(data)
+    with open(out, 'wb') as f:
+        f.write(struct.pack(HEADER, MAGIC, VERSION, len(images), len(index)))
+        f.write(index)
+        for name, w, h, data in images:
+            f.write(data)
+    return len(images), offset
+
+
+# 用正常、文件头错误、旧版本、文件头不完整、索引不完整的资源包分别调用 loadBundle()
+# 正常的资源包应当读取成功，其余应当返回 None 并改为读取 .pbm 文件，图片内容与资源包中相同
+def check():
+    host.install(simulated=True)
+    import pymg
+    name = '0.pbm'
+    failed = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        good = os.path.join(tmp, 'good.bin')
+        pack(good, names=[name])
+        with open(good, 'rb') as f:
+            data = f.read()
+        header = struct.calcsize(HEADER)
+        cases = (
+            ('good', data, True),
+            ('bad magic', b'XXXX' + data[4:], False),
+            ('old version', data[:4] + struct.pack('<H', VERSION + 1) + data[6:], False),
+            ('truncated header', data[:header - 3], False),
+            ('truncated index', data[:header + 2], False),
+            ('empty', b'', False),
+        )
+        expected = pymg.loadBundle(good).index[name]
+        want = bytes(pymg.Pbm(name).pbm)
+        for case, content, ok in cases:
+            path = os.path.join(tmp, 'case.bin')
+            with open(path, 'wb') as f:
+                f.write(content)
+            bundle = pymg.loadBundle(path)
+            loaded = bundle is not None
+            pixels = bytes(pymg.Pbm(name).pbm)
+            passed = loaded == ok and pixels == want and (not loaded or bundle.index[name] == expected)
+            failed += not passed
+            print('%-16s bundle loaded: %-5s  %s' % (case, loaded, 'ok' if passed else 'FAIL'))
+        pymg.loadBundle(os.path.join(tmp, 'missing.bin'))
+    return 1 if failed else 0
+
+
+def main(argv):
+    if argv == ['--check']:
+        return check()
+    out = argv[0] if argv else os.path.join(host.ROOT, 'assets.bin')
+    count, size = pack(out)
+    print('%s: %d images, %d bytes' % (out, count, size))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
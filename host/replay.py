@@ -0,0 +1,166 @@
+'''
+录制、查看和逐帧比较 pymg 的帧录像 (格式见 pymg.FrameRecorder)
+
+python -m host.replay record slide a.rec    # 以模拟时钟运行 host.bench 中的场景并录制
+python -m host.replay info a.rec            # 帧数、像素变化的帧数、时长
+python -m host.replay show a.rec 12         # 以字符画打印第 12 帧
+python -m host.replay diff a.rec b.rec      # 逐帧比较两个录像
+
+设备上的录像由 gui.record('a.rec') / gui.stopRecord() 生成
+
+diff 比较两个录像中像素变化的帧 (去掉与上一帧相同的帧) 的内容和时间:
+  像素全部相同时返回 0，否则打印第一处不同的帧并返回 1
+  只有时间不同时也返回 0，并打印时间不同的帧数和最大偏差
+用于验证渲染优化前后画面完全一致: 在优化前后的代码上分别 record 同一场景，再 diff 两个录像
+'''
+
+import struct, sys
+
+HEADER = '<4sBHH'
+FRAME = '<IH'
+MAGIC = b'PYMR'
+VERSION = 1
+
+
+class Recording:
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        # [(ms, 帧数据, 与上一帧相比是否变化)]
+        self.frames = []
+        self.size = 0
+
+    # 像素变化的帧
+    def changed(self):
+        return [(ms, data) for ms, data, changed in self.frames if changed]
+
+    def duration(self):
+        return self.frames[-1][0] if self.frames else 0
+
+    def pixel(self, data, x, y):
+        return data[(y >> 3) * self.width + x] >> (y & 7) & 1
+
+    # 两帧中不同的像素数
+    def count(self, a, b):
+        return sum(bin(x ^ y).count('1') for x, y in zip(a, b))
+
+    def ascii(self, data):
+        return [''.join('#' if self.pixel(data, x, y) else '.' for x in range(0, self.width))
+                for y in range(0, self.height)]
+
+
+def load(path):
+    with open(path, 'rb') as f:
+        stream = f.read()
+    magic, version, width, height = struct.unpack_from(HEADER, stream, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('%s is not a pymg recording' % path)
+    rec = Recording(width, height)
+    rec.size = len(stream)
+    frame = bytearray(width * ((height + 7) // 8))
+    pos = struct.calcsize(HEADER)
+    while pos < len(stream):
+        ms, n = struct.unpack_from(FRAME, stream, pos)
+        pos += struct.calcsize(FRAME)
+        end = pos + n
+        i = 0
+        while pos < end:
+            i += stream[pos]
+            count = stream[pos + 1]
+            pos += 2
+            for j in range(0, count):
+                frame[i + j] ^= stream[pos + j]
+            i += count
+            pos += count
+        rec.frames.append((ms, bytes(frame), n > 0))
+    return rec
+
+
+def record(name, path):
+    from host.bench import SCENARIOS, Simulator, _prepare
+    if name not in SCENARIOS:
+        print('unknown scenario: %s (%s)' % (name, ', '.join(SCENARIOS)))
+        return 1
+    setup, action, ms = SCENARIOS[name]
+    sim = Simulator()
+    _prepare(sim, setup)
+    sim.gui.record(path)
+    if action is not None:
+        action(sim)
+    sim.run(ms)
+    sim.gui.stopRecord()
+    return 0
+
+
+def info(path):
+    rec = load(path)
+    changed = rec.changed()
+    pixels = 0
+    last = bytes(len(rec.frames[0][1])) if rec.frames else b''
+    for ms, data in changed:
+        pixels += rec.count(last, data)
+        last = data
+    print('%s: %dx%d  %dms  frames: %d  changed: %d  pixels/changed frame: %d  %dB' % (
+        path, rec.width, rec.height, rec.duration(), len(rec.frames), len(changed),
+        pixels // max(len(changed), 1), rec.size))
+    return 0
+
+
+def show(path, index):
+    rec = load(path)
+    ms, data, changed = rec.frames[index]
+    print('frame %d  %dms%s' % (index, ms, '' if changed else '  (unchanged)'))
+    for line in rec.ascii(data):
+        print(line)
+    return 0
+
+
+def diff(path_a, path_b):
+    a = load(path_a)
+    b = load(path_b)
+    if (a.width, a.height) != (b.width, b.height):
+        print('size differs: %dx%d / %dx%d' % (a.width, a.height, b.width, b.height))
+        return 1
+    frames_a = a.changed()
+    frames_b = b.changed()
+    print('frames: %d / %d  changed: %d / %d' % (len(a.frames), len(b.frames), len(frames_a), len(frames_b)))
+    shifted = 0
+    offset = 0
+    for i in range(0, min(len(frames_a), len(frames_b))):
+        ms_a, data_a = frames_a[i]
+        ms_b, data_b = frames_b[i]
+        if data_a != data_b:
+            print('changed frame %d differs: %dms / %dms  %d pixels' % (i, ms_a, ms_b, a.count(data_a, data_b)))
+            for line_a, line_b in zip(a.ascii(data_a), b.ascii(data_b)):
+                print('%s   %s' % (line_a, line_b))
+            return 1
+        if ms_a != ms_b:
+            shifted += 1
+            if abs(ms_a - ms_b) > abs(offset):
+                offset = ms_b - ms_a
+    if len(frames_a) != len(frames_b):
+        print('changed frame count differs after %d identical frames' % min(len(frames_a), len(frames_b)))
+        return 1
+    if shifted:
+        print('pixels identical, %d frames shown at a different time (max %+dms)' % (shifted, offset))
+    else:
+        print('identical')
+    return 0
+
+
+def main(argv):
+    if len(argv) == 3 and argv[0] == 'record':
+        return record(argv[1], argv[2])
+    if len(argv) == 2 and argv[0] == 'info':
+        return info(argv[1])
+    if len(argv) == 3 and argv[0] == 'show':
+        return show(argv[1], int(argv[2]))
+    if len(argv) == 3 and argv[0] == 'diff':
+        return diff(argv[1], argv[2])
+    print(__doc__)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,48 @@
+'''
+在电脑上以 asyncio 模式运行时钟界面，验证耗时任务执行期间界面仍在刷新
+
+python -m host.run_async
+'''
+
+import host
+
+host.install()
+
+import asyncio, time
+import futaba_8md06inkm
+from pymg import *
+from host.sim import MainWindow, Encoder
+
+
+# 模拟一次 1 秒的网络请求
+async def slow_job(result):
+    start = time.ticks_ms()
+    await asyncio.sleep(1)
+    result.append(time.ticks_diff(time.ticks_ms(), start))
+
+
+async def main():
+    display = futaba_8md06inkm.VFD()
+    gui = MainWindow(display)
+    render = asyncio.create_task(gui.start_async())
+    await asyncio.sleep(0.5)
+
+    result = []
+    frames = len(display.frames)
+    gui.runTask(slow_job, result)
+    # 任务执行期间转动编码器，切换到下一页
+    Encoder(None).turn(3)
+    wake()
+    while not result:
+        await asyncio.sleep(0.05)
+    print('job took %dms, %d frames shown meanwhile, page %d' % (
+        result[0], len(display.frames) - frames, gui.pager.widgetsChecked))
+
+    # 按键事件经由 ThreadSafeFlag 交给渲染任务分发
+    gui.button._deliver(0)
+    await asyncio.sleep(0.1)
+    print('button dispatched, passthrough: %s' % gui.pager.buttonPassthrough)
+    render.cancel()
+
+
+asyncio.run(main())
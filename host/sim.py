@@ -0,0 +1,133 @@
+'''
+无界面运行完整的时钟界面 (与 main.py 相同的 MainWindow / RotaryPager)，时间由模拟时钟控制
+
+import host
+host.install(simulated=True)
+from host.sim import Simulator
+
+sim = Simulator()
+sim.run(1000)
+sim.encoder.turn(3)         # 向右转 3 格，切换页面
+sim.encoder.turn(-20, 10)   # 向左每 10ms 转 1 格，共 20 格
+sim.button.click()
+sim.run(2000)
+sim.button.doubleClick()    # 需要 gui.button.setDoubleClick(ms) 开启双击
+print(len(sim.display.frames))
+'''
+
+import time
+import host
+from machine import Pin
+import futaba_8md06inkm
+from pymg import *
+from pymg_example import RotaryPager
+
+
+# 与 main.py 中的 MainWindow 相同
+class MainWindow(Pymg):
+
+    def __init__(self, display, refresh_interval=16, fps=False):
+        super().__init__(display, (40, 7), refresh_interval, fps=fps)
+        self.button = Button(25)
+        self.pager = RotaryPager(self, (0, 0, 40, 7), scrollSpeed=0.1)
+        self.button.connect(self.pager.buttonCallback)
+        self.button.setEnable(True)
+
+
+# 旋转编码器: 按半步 (half_step) 格雷码依次改变 CLK / DT 电平，由中断回调解码
+class Encoder:
+
+    def __init__(self, sim, clk=21, dt=22):
+        self.sim = sim
+        # 编码器模块带上拉电阻，静止时两脚均为高电平
+        # 编码器服务在进程内共享，引脚由之前的模拟停在低电平时按半步转回高电平，保持解码状态一致
+        self.clk = Pin(clk, Pin.IN, Pin.PULL_UP)
+        self.dt = Pin(dt, Pin.IN, Pin.PULL_UP)
+        if not self.clk.value():
+            self.turn(1)
+
+    # steps > 0 顺时针，每一步是半个周期 (11 -> 00 或 00 -> 11)，顺时针 CLK 先变化，逆时针 DT 先变化
+    # interval 为每步间隔的毫秒数，0 时所有步立即完成
+    def turn(self, steps, interval=0):
+        if interval > 0:
+            now = self.sim.now()
+            for i in range(0, abs(steps)):
+                self.sim.at(now + i * interval, self.turn, 1 if steps > 0 else -1)
+            return
+        first, second = (self.clk, self.dt) if steps > 0 else (self.dt, self.clk)
+        for i in range(0, abs(steps)):
+            level = 1 - first.value()
+            first.value(level)
+            second.value(level)
+
+
+# 低电平有效的按键，按下 ms 毫秒后由模拟时钟松开
+class Key:
+
+    def __init__(self, sim, pin=25):
+        self.sim = sim
+        self.pin = Pin(pin, Pin.IN, Pin.PULL_UP)
+
+    def press(self, ms):
+        self.pin.value(0)
+        self.sim.at(self.sim.now() + ms, self.pin.value, 1)
+
+    def click(self):
+        self.press(50)
+
+    def longPress(self):
+        self.press(600)
+
+    # 松开 gap 毫秒后再单击一次
+    def doubleClick(self, gap=100):
+        self.click()
+        self.sim.at(self.sim.now() + 50 + gap, self.click)
+
+
+class Simulator:
+
+    def __init__(self, refresh_interval=16, fps=False):
+        if not host.simulated():
+            raise RuntimeError('call host.install(simulated=True) first')
+        self.encoder = Encoder(self)
+        self.display = futaba_8md06inkm.VFD()
+        self.gui = MainWindow(self.display, refresh_interval, fps)
+        self.button = Key(self)
+        self._start = time.ticks_ms()
+        self._events = []
+
+    # 模拟开始以来的毫秒数
+    def now(self):
+        return time.ticks_diff(time.ticks_ms(), self._start)
+
+    # 在 ms 时刻 (模拟开始以来) 调用 fn(*args)
+    def at(self, ms, fn, *args):
+        self._events.append((ms, fn, args))
+        self._events.sort(key=lambda event: event[0])
+
+    def _fire(self):
+        now = self.now()
+        while self._events and self._events[0][0] <= now:
+            ms, fn, args = self._events.pop(0)
+            fn(*args)
+
+    # 执行一轮 step()，返回距离下一次截止时间的毫秒数
+    def step(self):
+        return self.gui.step()
+
+    # 与 Pymg.start() 相同地循环 step / idle，运行 ms 毫秒的模拟时间
+    def run(self, ms):
+        end = self.now() + ms
+        while self.now() < end:
+            self._fire()
+            sleep = self.step()
+            now = self.now()
+            if sleep > end - now:
+                sleep = end - now
+            if self._events and sleep > self._events[0][0] - now:
+                sleep = self._events[0][0] - now
+            # 模拟时钟下计算不耗时，至少推进 1ms 保证时间前进
+            if sleep < 1:
+                time.sleep_ms(1)
+            else:
+                self.gui.idle(sleep)
@@ -0,0 +1,135 @@
+'''
+MicroPython framebuf 模块的纯 Python 实现，供电脑上运行 pymg 使用
+
+只支持 pymg 用到的单色格式，像素布局、裁剪、缓冲区大小检查以及带透明色的 blit() 与 C 实现一致
+'''
+
+MONO_VLSB = 0
+MONO_HLSB = 3
+MONO_HMSB = 4
+
+
+class FrameBuffer:
+
+    def __init__(self, buffer, width, height, format, stride=None):
+        if stride is None:
+            stride = width
+        if format == MONO_VLSB:
+            need = ((height + 7) >> 3) * stride
+        elif format in (MONO_HLSB, MONO_HMSB):
+            stride = (stride + 7) & ~7
+            need = (stride >> 3) * height
+        else:
+            raise ValueError('invalid format')
+        if len(buffer) < need:
+            raise ValueError('buffer too small')
+        self.buffer = buffer
+        self.width = width
+        self.height = height
+        self.format = format
+        self.stride = stride
+
+    def _index(self, x, y):
+        if self.format == MONO_VLSB:
+            return (y >> 3) * self.stride + x, y & 7
+        index = (x + y * self.stride) >> 3
+        if self.format == MONO_HLSB:
+            return index, 7 - (x & 7)
+        return index, x & 7
+
+    def _get(self, x, y):
+        index, bit = self._index(x, y)
+        return (self.buffer[index] >> bit) & 1
+
+    def _set(self, x, y, c):
+        index, bit = self._index(x, y)
+        if c:
+            self.buffer[index] |= 1 << bit
+        else:
+            self.buffer[index] &= ~(1 << bit) & 0xFF
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        if c is None:
+            return self._get(x, y)
+        self._set(x, y, c)
+
+    def fill(self, c):
+        v = 0xFF if c else 0
+        buf = self.buffer
+        for i in range(len(buf)):
+            buf[i] = v
+
+    def fill_rect(self, x, y, w, h, c):
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + w, self.width)
+        y1 = min(y + h, self.height)
+        for yy in range(y0, y1):
+            for xx in range(x0, x1):
+                self._set(xx, yy, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+        else:
+            self.fill_rect(x, y, w, 1, c)
+            self.fill_rect(x, y + h - 1, w, 1, c)
+            self.fill_rect(x, y, 1, h, c)
+            self.fill_rect(x + w - 1, y, 1, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        dx = abs(x2 - x1)
+        dy = -abs(y2 - y1)
+        sx = 1 if x1 < x2 else -1
+        sy = 1 if y1 < y2 else -1
+        err = dx + dy
+        while True:
+            self.pixel(x1, y1, c)
+            if x1 == x2 and y1 == y2:
+                break
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x1 += sx
+            if e2 <= dx:
+                err += dx
+                y1 += sy
+
+    def scroll(self, xstep, ystep):
+        w, h = self.width, self.height
+        src = [[self._get(x, y) for x in range(w)] for y in range(h)]
+        for y in range(h):
+            for x in range(w):
+                sx, sy = x - xstep, y - ystep
+                if 0 <= sx < w and 0 <= sy < h:
+                    self._set(x, y, src[sy][sx])
+
+    def text(self, s, x, y, c=1):
+        # 用 8x8 方块代替字形，只标出文字所在位置
+        for i, ch in enumerate(s):
+            if ch != ' ':
+                self.rect(x + i * 8 + 1, y + 1, 6, 6, c)
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        if isinstance(fbuf, tuple):
+            buf, w, h, fmt = fbuf[:4]
+            fbuf = FrameBuffer(buf, w, h, fmt, fbuf[4] if len(fbuf) > 4 else None)
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + fbuf.width, self.width)
+        y1 = min(y + fbuf.height, self.height)
+        for yy in range(y0, y1):
+            for xx in range(x0, x1):
+                col = fbuf._get(xx - x, yy - y)
+                if palette is not None:
+                    col = palette.pixel(col, 0)
+                if col != key:
+                    self._set(xx, yy, col)
@@ -0,0 +1,28 @@
+'''
+8-MD-06INKM VFD 驱动的替身: 40x7 MONO_VLSB 帧缓冲，记录每次 show() 的画面
+'''
+
+import framebuf
+
+# pymg.VfdBackend 读取的命令和位序，设备上的驱动需要提供相同的常量
+# CGRAM 写入 (0x40 + 字符号，之后为 5 列数据)、刷新显示，数据低位先发，SPI 高位先发时逐字节反转
+CGRAM_WRITE = 0x40
+DISPLAY_REFRESH = 0xE8
+BIT_REVERSE = bytes(int('{:08b}'.format(i)[::-1], 2) for i in range(0, 256))
+
+
+class VFD(framebuf.FrameBuffer):
+    # 帧缓冲格式，pymg 的图片和控件缓冲区使用相同格式
+    format = framebuf.MONO_VLSB
+
+    def __init__(self, spi=None, rst=None, cs=None, en=None):
+        self.buf = bytearray(40)
+        super().__init__(self.buf, 40, 7, framebuf.MONO_VLSB)
+        self.frames = []
+        self.dimming = 0
+
+    def show(self):
+        self.frames.append(bytes(self.buf))
+
+    def set_display_dimming(self, value):
+        self.dimming = value
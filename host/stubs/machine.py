@@ -0,0 +1,152 @@
+'''
+MicroPython machine 模块的替身
+
+Pin 的电平和中断回调按引脚号保存，与硬件一样，同一引脚的多个 Pin 对象共享状态，后设置的中断回调覆盖先前的
+用 Pin(n).value(v) 改变电平时按触发条件调用回调，相当于一次边沿中断
+Timer 的回调由主机时钟在 time.sleep_ms() 中触发
+RTC 从主机时钟计时，模拟时钟下从 2024-01-01 12:00:00 开始
+'''
+
+import time
+import host
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 2
+    PULL_DOWN = 1
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    # 引脚号 -> 电平 / (回调, 触发条件)
+    _levels = {}
+    _irqs = {}
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        self.pull = pull
+        if value is not None:
+            Pin._levels[id] = 1 if value else 0
+        elif id not in Pin._levels:
+            Pin._levels[id] = 1 if pull == Pin.PULL_UP else 0
+
+    def __repr__(self):
+        return 'Pin(%d)' % self.id
+
+    def value(self, value=None):
+        if value is None:
+            return Pin._levels[self.id]
+        value = 1 if value else 0
+        old = Pin._levels[self.id]
+        Pin._levels[self.id] = value
+        irq = Pin._irqs.get(self.id)
+        if irq is not None and value != old:
+            handler, trigger = irq
+            if (value and trigger & Pin.IRQ_RISING) or (not value and trigger & Pin.IRQ_FALLING):
+                handler(self)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def irq(self, handler=None, trigger=IRQ_RISING | IRQ_FALLING):
+        if handler is None:
+            Pin._irqs.pop(self.id, None)
+        else:
+            Pin._irqs[self.id] = (handler, trigger)
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    _active = []
+
+    def __init__(self, id=-1):
+        self.id = id
+        self._callback = None
+        self._period = 0
+        self._mode = Timer.PERIODIC
+        self._next = 0
+
+    def init(self, mode=PERIODIC, period=-1, callback=None, freq=-1):
+        if freq > 0:
+            period = 1000 // freq
+        self._mode = mode
+        self._period = period
+        self._callback = callback
+        self._next = time.ticks_add(time.ticks_ms(), period)
+        if self not in Timer._active:
+            Timer._active.append(self)
+
+    def deinit(self):
+        if self in Timer._active:
+            Timer._active.remove(self)
+
+    # 由主机时钟调用，触发所有到期的定时器
+    @classmethod
+    def _fire(cls, now):
+        for timer in list(cls._active):
+            while timer in cls._active and time.ticks_diff(now, timer._next) >= 0:
+                if timer._mode == Timer.ONE_SHOT:
+                    timer.deinit()
+                else:
+                    timer._next = time.ticks_add(timer._next, max(timer._period, 1))
+                timer._callback(timer)
+
+
+class RTC:
+    # datetime() 返回 (年, 月, 日, 星期, 时, 分, 秒, 微秒)
+    _offset = None
+
+    def _epoch(self):
+        if RTC._offset is None:
+            if host.simulated():
+                RTC._offset = time.mktime((2024, 1, 1, 12, 0, 0, 0, 0, -1))
+            else:
+                RTC._offset = time.time() - host.now_us() / 1000000
+        return RTC._offset
+
+    def datetime(self, datetimetuple=None):
+        if datetimetuple is not None:
+            year, month, day, weekday, hours, minutes, seconds = datetimetuple[:7]
+            t = time.mktime((year, month, day, hours, minutes, seconds, 0, 0, -1))
+            RTC._offset = t - host.now_us() / 1000000
+            return
+        now = self._epoch() + host.now_us() / 1000000
+        lt = time.localtime(int(now))
+        return (lt[0], lt[1], lt[2], lt[6], lt[3], lt[4], lt[5], int((now % 1) * 1000000))
+
+
+class SPI:
+
+    def __init__(self, id, baudrate=1000000, **kwargs):
+        self.id = id
+        self.baudrate = baudrate
+        self.written = 0
+
+    def write(self, buf):
+        self.written += len(buf)
+
+
+_freq = 160000000
+
+
+def freq(hz=None):
+    global _freq
+    if hz is None:
+        return _freq
+    _freq = hz
+
+
+def lightsleep(ms=None):
+    time.sleep_ms(ms)
+
+
+def idle():
+    pass
@@ -0,0 +1,30 @@
+'''MicroPython micropython 模块的替身'''
+
+
+def const(expr):
+    return expr
+
+
+def schedule(func, arg):
+    func(arg)
+
+
+def native(func):
+    return func
+
+
+def viper(func):
+    return func
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+# CPython 上无法禁止分配，只保持调用方式一致
+def heap_lock():
+    pass
+
+
+def heap_unlock():
+    return 0
@@ -0,0 +1,49 @@
+'''
+MicroPython network 模块的替身
+
+WLAN.script 是 connect() 之后依次生效的 (延时 ms, 是否已连接) 列表，用来模拟连接耗时和连接失败
+'''
+
+import time
+
+STA_IF = 0
+AP_IF = 1
+
+
+class WLAN:
+    # 默认 connect() 后 1.5 秒连接成功
+    script = [(1500, True)]
+
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+        self._active = False
+        self._connected = False
+        self._steps = []
+        self._since = 0
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+        if not self._active:
+            self._connected = False
+
+    def connect(self, ssid=None, key=None):
+        self.ssid = ssid
+        self._steps = list(WLAN.script)
+        self._since = time.ticks_ms()
+
+    def disconnect(self):
+        self._steps = []
+        self._connected = False
+
+    def isconnected(self):
+        while self._steps and time.ticks_diff(time.ticks_ms(), self._since) >= self._steps[0][0]:
+            delay, self._connected = self._steps.pop(0)
+            self._since = time.ticks_add(self._since, delay)
+        return self._active and self._connected
+
+    def ifconfig(self):
+        if self.isconnected():
+            return ('192.168.6.100', '255.255.255.0', '192.168.6.1', '192.168.6.1')
+        return ('0.0.0.0', '0.0.0.0', '0.0.0.0', '0.0.0.0')
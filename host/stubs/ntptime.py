@@ -0,0 +1,14 @@
+'''MicroPython ntptime 模块的替身，settime() 耗时 delay_ms，fail 为 True 时失败'''
+
+import time
+
+NTP_DELTA = 3155673600
+host = 'pool.ntp.org'
+delay_ms = 300
+fail = False
+
+
+def settime():
+    time.sleep_ms(delay_ms)
+    if fail:
+        raise OSError(110)
@@ -12,6 +12,8 @@ rst = Pin(5)  # reset
 cs = Pin(26)  # chip select, some modules do not have a pin for this
 display = futaba_8md06inkm.VFD(hspi, rst, cs, en)
 display.set_display_dimming(127)
+# 图片资源包由 host/pack.py 生成，不存在时逐个读取 .pbm 文件
+loadBundle('assets.bin')
 
 
 class MainWindow(Pymg):
@@ -25,7 +27,9 @@ class MainWindow(Pymg):
         self.button.setEnable(True)
 
 
-mainWindow = MainWindow(display, (40, 7), 25)
+# 只发送变化字符的 pymg.VfdBackend 尚未在屏幕上验证，需要时替换为:
+# MainWindow(VfdBackend(display, hspi, cs, futaba_8md06inkm), (40, 7), 25)
+mainWindow = MainWindow(FramebufBackend(display, 40, 7), (40, 7), 25)
 
 while True:
     try:
@@ -1,19 +1,282 @@
-from machine import Pin, Timer
-import time, framebuf, network
-from math import ceil
+from machine import Pin, Timer, lightsleep
+import time, framebuf, network, struct, micropython
+from array import array
+from math import exp, cos, pi
 from rotary_irp_esp import RotaryIRQ
 
+# 输入中断置位，主循环据此提前结束休眠
+_wake = False
+# asyncio 模式下的 ThreadSafeFlag，输入中断通过它唤醒渲染任务
+_flag = None
+# 等待在 step() 开始时分发的按键事件，控件只在两轮刷新之间处理按键，不会打断合成
+_button_events = []
+# 旋转编码器服务，每对引脚一个，由 getEncoder() 创建，主循环每轮取出一次它们在中断中记录的转动事件
+_encoders = []
+# 打包的图片资源，由 loadBundle() 打开
+_bundle = None
+# 图片和控件缓冲区使用的 framebuf 格式，与屏幕一致时逐级 blit 不需要转换位序，由 Pymg 按显示后端设置
+_format = framebuf.MONO_VLSB
+# 默认字体，由 getFont() 第一次调用时创建
+_font = None
+# 本轮 step() 中因完全在父窗口可见区域之外而跳过的控件数 (更新和重绘)
+_culled = 0
 
-# 帧缓冲局部反转
-def framebuf_inversion(original_buf, x, y, w, h):
-    if h < 8:
-        h = 8
-    buf = bytearray((h // 8) * w)
-    fbuf = framebuf.FrameBuffer(buf, w, h, framebuf.MONO_VLSB)
-    fbuf.blit(original_buf, 0, 0, -1)
-    for i in range(0, len(buf)):
-        buf[i] = ~buf[i]
-    original_buf.blit(fbuf, int(x), int(y), -1)
+
+def _cull():
+    global _culled
+    _culled += 1
+
+
+def wake():
+    global _wake
+    _wake = True
+    if _flag is not None:
+        _flag.set()
+
+
+def _asyncio():
+    try:
+        import uasyncio as asyncio
+    except ImportError:
+        import asyncio
+    return asyncio
+
+
+# CPython 的 asyncio 没有 ThreadSafeFlag，用 Event 代替
+class _Flag:
+
+    def __init__(self, asyncio):
+        self._event = asyncio.Event()
+
+    def set(self):
+        self._event.set()
+
+    async def wait(self):
+        await self._event.wait()
+        self._event.clear()
+
+
+async def _sleep_ms(asyncio, ms):
+    if hasattr(asyncio, 'sleep_ms'):
+        await asyncio.sleep_ms(ms)
+    else:
+        await asyncio.sleep(ms / 1000)
+
+
+# 等待标志被置位，最多等待 ms 毫秒
+async def _wait_ms(asyncio, flag, ms):
+    try:
+        if hasattr(asyncio, 'wait_for_ms'):
+            await asyncio.wait_for_ms(flag.wait(), ms)
+        else:
+            await asyncio.wait_for(flag.wait(), ms / 1000)
+    except asyncio.TimeoutError:
+        pass
+
+
+# 帧缓冲局部反转: 直接异或 width x height、格式为 fmt 的帧缓冲数据 data 中的矩形区域，不分配内存
+def invert_rect(data, width, height, fmt, x, y, w, h):
+    x0 = x if x > 0 else 0
+    y0 = y if y > 0 else 0
+    x1 = x + w if x + w < width else width
+    y1 = y + h if y + h < height else height
+    if x0 >= x1 or y0 >= y1:
+        return
+    if fmt == framebuf.MONO_VLSB:
+        # 每字节是一列中的 8 行，按页用同一个掩码异或
+        for page in range(y0 >> 3, ((y1 - 1) >> 3) + 1):
+            top = page << 3
+            mask = 0xFF
+            if y0 > top:
+                mask &= 0xFF << (y0 - top)
+            if y1 < top + 8:
+                mask &= 0xFF >> (top + 8 - y1)
+            i = page * width
+            for col in range(i + x0, i + x1):
+                data[col] ^= mask
+        return
+    # 每字节是一行中的 8 列，两端字节用边缘掩码，中间整字节异或
+    stride = (width + 7) >> 3
+    first = x0 >> 3
+    last = (x1 - 1) >> 3
+    head = 0xFF >> (x0 & 7)
+    tail = (0xFF << (7 - ((x1 - 1) & 7))) & 0xFF
+    if fmt == framebuf.MONO_HMSB:
+        head = (0xFF << (x0 & 7)) & 0xFF
+        tail = 0xFF >> (7 - ((x1 - 1) & 7))
+    if first == last:
+        head &= tail
+    for row in range(y0 * stride, y1 * stride, stride):
+        data[row + first] ^= head
+        if last > first:
+            for i in range(row + first + 1, row + last):
+                data[i] ^= 0xFF
+            data[row + last] ^= tail
+
+
+# 设置之后读取的图片和创建的控件使用的 framebuf 格式
+def setFormat(fmt):
+    global _format
+    _format = fmt
+
+
+def getFormat():
+    return _format
+
+
+# 指定格式的帧缓冲所需的字节数
+def buffer_size(w, h, fmt):
+    if fmt == framebuf.MONO_VLSB:
+        return w * ((h + 7) // 8)
+    return ((w + 7) // 8) * h
+
+
+# 缓动曲线: 把动画进度 0 - CURVE_STEPS 映射为位置比例 0 - 256，弹簧曲线中途会超过 256
+# 只在导入时计算一次，动画过程中只做整数运算
+CURVE_STEPS = 32
+
+
+def _curve(fn):
+    curve = array('h', [round(fn(i / CURVE_STEPS) * 256) for i in range(0, CURVE_STEPS + 1)])
+    curve[CURVE_STEPS] = 256
+    return curve
+
+
+EASE_LINEAR = _curve(lambda t: t)
+EASE_OUT = _curve(lambda t: 1 - (1 - t) ** 3)
+EASE_SPRING = _curve(lambda t: 1 - exp(-6 * t) * cos(3 * pi * t))
+
+
+# 按时间插值的整数动画: 在 duration 毫秒内从 begin 移动到 end，与更新频率无关
+class Tween:
+
+    def __init__(self):
+        self.begin = 0
+        self.end = 0
+        self.duration = 1
+        self.curve = EASE_LINEAR
+        self.loop = False
+        self.active = False
+        self._start = 0
+
+    # loop 为 True 时到达 end 后从 begin 重新开始
+    def start(self, begin, end, duration, curve=EASE_LINEAR, loop=False):
+        self.begin = begin
+        self.end = end
+        self.duration = duration if duration > 0 else 1
+        self.curve = curve
+        self.loop = loop
+        self.active = True
+        self._start = time.ticks_ms()
+
+    def stop(self):
+        self.active = False
+
+    def done(self, now):
+        return not self.loop and time.ticks_diff(now, self._start) >= self.duration
+
+    # 开始以来的毫秒数
+    def elapsed(self, now):
+        return time.ticks_diff(now, self._start)
+
+    def value(self, now):
+        duration = self.duration
+        elapsed = time.ticks_diff(now, self._start)
+        if elapsed >= duration:
+            if not self.loop:
+                return self.end
+            elapsed %= duration
+        if elapsed <= 0:
+            return self.begin
+        if self.curve is EASE_LINEAR:
+            # 线性动画直接按时间比例计算，位置恰好在半像素处进位
+            d = (self.end - self.begin) * elapsed
+            if d >= 0:
+                return self.begin + (d * 2 + duration) // (duration * 2)
+            return self.begin - (duration - d * 2) // (duration * 2)
+        pos = elapsed * CURVE_STEPS
+        i = pos // duration
+        a = self.curve[i]
+        k = a + (self.curve[i + 1] - a) * (pos - i * duration) // duration
+        d = (self.end - self.begin) * k
+        # 四舍五入，正负方向对称
+        if d >= 0:
+            return self.begin + ((d + 128) >> 8)
+        return self.begin - ((128 - d) >> 8)
+
+
+# 脏区域，记录 [x0, x1) x [y0, y1) 的外接矩形，为空时不需要重绘
+class DirtyRect:
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.x0 = 0
+        self.y0 = 0
+        self.x1 = 0
+        self.y1 = 0
+
+    def isEmpty(self):
+        return self.x0 >= self.x1 or self.y0 >= self.y1
+
+    # 合并一个矩形，返回脏区域是否扩大
+    def add(self, x, y, w, h):
+        if w <= 0 or h <= 0:
+            return False
+        if self.isEmpty():
+            self.x0 = x
+            self.y0 = y
+            self.x1 = x + w
+            self.y1 = y + h
+            return True
+        grown = False
+        if x < self.x0:
+            self.x0 = x
+            grown = True
+        if y < self.y0:
+            self.y0 = y
+            grown = True
+        if x + w > self.x1:
+            self.x1 = x + w
+            grown = True
+        if y + h > self.y1:
+            self.y1 = y + h
+            grown = True
+        return grown
+
+    # 裁剪到 (0, 0, w, h) 范围内
+    def clip(self, w, h):
+        if self.x0 < 0:
+            self.x0 = 0
+        if self.y0 < 0:
+            self.y0 = 0
+        if self.x1 > w:
+            self.x1 = w
+        if self.y1 > h:
+            self.y1 = h
+
+    def intersects(self, x, y, w, h):
+        return x < self.x1 and x + w > self.x0 and y < self.y1 and y + h > self.y0
+
+    # 扩大到完整覆盖所有与之相交的控件，保证重新贴图后层叠顺序不变，widgets 只包含可见控件
+    def cover(self, widgets):
+        grown = True
+        while grown:
+            grown = False
+            for widget in widgets:
+                if self.intersects(widget.x, widget.y, widget.w, widget.h):
+                    if self.add(widget.x, widget.y, widget.w, widget.h):
+                        grown = True
+
+    def fill(self, buffer, c=0):
+        buffer.fill_rect(self.x0, self.y0, self.x1 - self.x0, self.y1 - self.y0, c)
+
+    def copy(self, rect):
+        self.x0 = rect.x0
+        self.y0 = rect.y0
+        self.x1 = rect.x1
+        self.y1 = rect.y1
 
 
 class Pbm:
@@ -21,10 +284,18 @@ class Pbm:
     h = None
     pbm = None
     filename = None
+    fb = None
+    format = framebuf.MONO_HLSB
 
-    def __init__(self, file):
+    # 已用 loadBundle() 打开资源包且包中有该文件时从资源包读取，否则读取 .pbm 文件
+    # 读取后转换为与屏幕相同的格式，file 为 None 时创建空图片，由调用者填写数据
+    def __init__(self, file=None):
         self.filename = file
-        self.loadPBM(file)
+        if file is None:
+            return
+        if _bundle is None or not _bundle.load(self):
+            self.loadPBM(file)
+        self.convert(_format)
 
     def loadPBM(self, file):
         with open(file, 'rb') as f:
@@ -33,59 +304,871 @@ class Pbm:
             self.h = int(f.readline())
             self.pbm = bytearray(f.read())
             f.close()
-
+        self.format = framebuf.MONO_HLSB
+        self.fb = None
+
+    # 转换图片数据的位序，只在读取时执行一次
+    def convert(self, fmt):
+        if fmt == self.format:
+            return
+        buf = bytearray(buffer_size(self.w, self.h, fmt))
+        framebuf.FrameBuffer(buf, self.w, self.h, fmt).blit(self.pbmPrint(), 0, 0)
+        self.pbm = buf
+        self.format = fmt
+        self.fb = None
+
+    # FrameBuffer 只在第一次调用时创建，之后复用，避免每帧分配
     def pbmPrint(self) -> framebuf:
-        return framebuf.FrameBuffer(self.pbm, self.w, self.h, framebuf.MONO_HLSB)
+        if self.fb is None:
+            self.fb = framebuf.FrameBuffer(self.pbm, self.w, self.h, self.format)
+        return self.fb
 
+    # 最近邻缩放，每个输出像素取其中心对应的源像素，源坐标预先算成整数表
+    # 逐字节拼出输出，与上一行 (MONO_VLSB 为上一列) 取自同一源时直接复制
     def zoom(self, w, h):
-        Image = self.pbmPrint()
-        buffer = bytearray((w * h) // 8)
-        newImage = framebuf.FrameBuffer(buffer, w, h, framebuf.MONO_HLSB)
-        alpha_w = w / self.w
-        alpha_h = h / self.h
-        for x in range(0, w):
+        fmt = self.format
+        src = self.pbm
+        buffer = bytearray(buffer_size(w, h, fmt))
+        xs = array('H', [(2 * x + 1) * self.w // (2 * w) for x in range(0, w)])
+        ys = array('H', [(2 * y + 1) * self.h // (2 * h) for y in range(0, h)])
+        if fmt == framebuf.MONO_VLSB:
+            sw = self.w
+            pages = (h + 7) >> 3
+            for x in range(0, w):
+                sx = xs[x]
+                if x > 0 and sx == xs[x - 1]:
+                    for i in range(x, pages * w, w):
+                        buffer[i] = buffer[i - 1]
+                    continue
+                for page in range(0, pages):
+                    byte = 0
+                    for y in range(page << 3, min(h, (page + 1) << 3)):
+                        sy = ys[y]
+                        if src[(sy >> 3) * sw + sx] >> (sy & 7) & 1:
+                            byte |= 1 << (y & 7)
+                    buffer[page * w + x] = byte
+        else:
+            sstride = (self.w + 7) >> 3
+            stride = (w + 7) >> 3
+            msb = fmt == framebuf.MONO_HLSB
             for y in range(0, h):
-                resX = round(x / alpha_w)
-                resY = round(y / alpha_h)
-                newImage.pixel(x, y, Image.pixel(resX, resY))
-        return newImage, w, h
-
+                row = y * stride
+                if y > 0 and ys[y] == ys[y - 1]:
+                    for i in range(row, row + stride):
+                        buffer[i] = buffer[i - stride]
+                    continue
+                srow = ys[y] * sstride
+                for i in range(0, stride):
+                    byte = 0
+                    for x in range(i << 3, min(w, (i + 1) << 3)):
+                        sx = xs[x]
+                        if msb:
+                            if src[srow + (sx >> 3)] >> (7 - (sx & 7)) & 1:
+                                byte |= 0x80 >> (x & 7)
+                        elif src[srow + (sx >> 3)] >> (sx & 7) & 1:
+                            byte |= 1 << (x & 7)
+                    buffer[row + i] = byte
+        return framebuf.FrameBuffer(buffer, w, h, fmt), w, h
+
+
+# MicroPython 的 struct 没有 error，数据长度不对时抛出 ValueError
+_StructError = getattr(struct, 'error', ValueError)
+
+
+# 资源包: 把多个 .pbm 图片打包为一个文件，由 host/pack.py 生成
+# 文件头 '<4sHHI': b'PBMB', 版本, 图片数, 索引长度
+# 索引每项: 名称长度 (B), 名称 (不含开头的 '/'), '<HHIIB': 宽, 高, 数据偏移, 数据长度, framebuf 格式
+class PbmBundle:
+    MAGIC = b'PBMB'
+    VERSION = 1
+    HEADER = '<4sHHI'
+    ENTRY = '<HHIIB'
 
+    def __init__(self, file):
+        self.file = open(file, 'rb')
+        try:
+            self._readIndex(file)
+        except:
+            self.file.close()
+            raise
+
+    # 文件头或索引不完整时 struct.unpack 抛出 struct.error (MicroPython 为 ValueError) 或 IndexError
+    def _readIndex(self, file):
+        magic, version, count, size = struct.unpack(self.HEADER, self.file.read(struct.calcsize(self.HEADER)))
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError('%s is not a pbm bundle (version %d)' % (file, self.VERSION))
+        index = self.file.read(size)
+        entry = struct.calcsize(self.ENTRY)
+        self.index = {}
+        i = 0
+        for n in range(0, count):
+            length = index[i]
+            name = index[i + 1:i + 1 + length].decode()
+            i += 1 + length
+            self.index[name] = struct.unpack(self.ENTRY, index[i:i + entry])
+            i += entry
+
+    def names(self):
+        return list(self.index.keys())
+
+    # 读取图片数据到 pbm，包中没有该文件时返回 False
+    def load(self, pbm) -> bool:
+        name = pbm.filename.lstrip('/')
+        if name not in self.index:
+            return False
+        w, h, offset, size, fmt = self.index[name]
+        buf = bytearray(size)
+        self.file.seek(offset)
+        self.file.readinto(buf)
+        pbm.w = w
+        pbm.h = h
+        pbm.pbm = buf
+        pbm.format = fmt
+        pbm.fb = None
+        return True
+
+    def close(self):
+        self.file.close()
+
+
+# 打开资源包，之后创建的 Pbm 优先从资源包读取，文件不存在时仍逐个读取 .pbm 文件
+def loadBundle(file='assets.bin'):
+    global _bundle
+    if _bundle is not None:
+        _bundle.close()
+        _bundle = None
+    try:
+        _bundle = PbmBundle(file)
+    except OSError:
+        print('PBM: bundle %s not found, load .pbm files' % file)
+    except (ValueError, IndexError, _StructError) as e:
+        # 旧版本或损坏的资源包
+        print('PBM: bundle %s not usable (%s), load .pbm files' % (file, e))
+    return _bundle
+
+
+# 比例字体: 按字形表把字符串拼成一张图片，去掉每个字形左右的空白列，字符之间空 gap 列
+# 保留最近 cache 个字符串的渲染结果，重复显示同样的文字不再拼接
+# glyphs 为字形表模块，格式见 font5x7.py
+class Font:
+
+    def __init__(self, glyphs=None, gap=1, space=3, cache=8):
+        if glyphs is None:
+            import font5x7 as glyphs
+        self.first = glyphs.FIRST
+        self.h = glyphs.HEIGHT
+        self.data = glyphs.GLYPHS
+        self.gap = gap
+        self.cache = cache
+        size = glyphs.WIDTH
+        count = len(self.data) // size
+        # 每个字形去掉空白后第一列的位置和宽度，空白字形 (空格) 宽 space 列
+        self._start = array('H', [0] * count)
+        self._width = bytearray(count)
+        for i in range(0, count):
+            base = i * size
+            left = base
+            right = base + size
+            while left < right and self.data[left] == 0:
+                left += 1
+            while right > left and self.data[right - 1] == 0:
+                right -= 1
+            if left == right:
+                self._start[i] = base
+                self._width[i] = space
+            else:
+                self._start[i] = left
+                self._width[i] = right - left
+        self._unknown = ord('?') - self.first
+        self._texts = {}
+        self._order = []
+
+    def _glyph(self, char):
+        i = ord(char) - self.first
+        if i < 0 or i >= len(self._width):
+            return self._unknown
+        return i
+
+    # 文字的宽度 (像素)
+    def width(self, text):
+        w = 0
+        for char in text:
+            w += self._width[self._glyph(char)] + self.gap
+        return w - self.gap if w > 0 else 0
+
+    # 把文字渲染为 Pbm，可直接交给 Lable.setPbm()
+    def render(self, text) -> Pbm:
+        pbm = self._texts.get(text)
+        if pbm is not None:
+            self._order.remove(text)
+            self._order.append(text)
+            return pbm
+        w = self.width(text)
+        if w == 0:
+            w = 1
+        # 字形每列一个字节，与 MONO_VLSB 的一页相同，逐列复制
+        buf = bytearray(w)
+        data = self.data
+        x = 0
+        for char in text:
+            i = self._glyph(char)
+            start = self._start[i]
+            for col in range(0, self._width[i]):
+                buf[x + col] = data[start + col]
+            x += self._width[i] + self.gap
+        pbm = Pbm()
+        pbm.w = w
+        pbm.h = self.h
+        pbm.pbm = buf
+        pbm.format = framebuf.MONO_VLSB
+        pbm.convert(_format)
+        self._texts[text] = pbm
+        self._order.append(text)
+        if len(self._order) > self.cache:
+            del self._texts[self._order.pop(0)]
+        return pbm
+
+
+def getFont():
+    global _font
+    if _font is None:
+        _font = Font()
+    return _font
+
+
+# 图片管理: 按文件名登记，第一次使用时读取
+# budget 为已加载图片数据的字节上限，超出时释放最久未使用且未固定 (pin) 的图片，之后再用到时重新读取
+# strip() / zoom() 的结果计入 used，和来源图片一起释放
 class PbmManager:
 
-    def __init__(self):
+    def __init__(self, budget=None):
+        # 已加载的图片
         self.pbms = {}
+        # 文件名 -> 整数句柄，句柄是 _list 的下标
+        self._handles = {}
+        self._names = []
+        self._list = []
+        self._pinned = []
+        # 每个句柄最后一次使用的序号，用于找出最久未使用的图片
+        self._stamps = []
+        self._stamp = 0
+        # 数字滚动用的拼接图，(上图句柄 << 16 | 下图句柄) -> FrameBuffer
+        self._strips = {}
+        # 缩放图，(句柄 << 20 | 宽 << 10 | 高) -> FrameBuffer，宽高需小于 1024
+        self._zooms = {}
+        self.budget = budget
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def setBudget(self, budget):
+        self.budget = budget
+        self._evict(None)
 
     def get_Pbm(self, filename):
-        if filename in self.pbms:
-            return self.pbms[filename]
+        if filename in self._handles:
+            return self.get(self._handles[filename])
         else:
             print('PBM: %s not load |get' % filename)
             return None
 
-    def add_pbm(self, pbm: Pbm):
-        self.pbms[pbm.filename] = pbm
+    # 获取文件名对应的句柄，在初始化时调用一次，之后用 get() 查找，不需要每帧拼接路径
+    def handle(self, filename):
+        if filename in self._handles:
+            return self._handles[filename]
+        else:
+            print('PBM: %s not load |handle' % filename)
+            return None
 
+    # 返回的 Pbm 只在本帧使用，不要保存在控件中，否则图片被释放后内存不能回收，再次 get() 会读取出第二份
+    # 需要长期显示的图片保存句柄，如 Lable.setPbmHandle()
+    def get(self, handle) -> Pbm:
+        pbm = self._list[handle]
+        if pbm is None:
+            self.misses += 1
+            pbm = Pbm(self._names[handle])
+            self._store(handle, pbm)
+        else:
+            self.hits += 1
+        self._touch(handle)
+        return pbm
+
+    # 把两张同样大小的图片上下拼接，中间空一行，滚动时一次贴图即可，结果在所有控件间共享
+    def strip(self, top, bottom) -> framebuf:
+        key = top << 16 | bottom
+        fb = self._strips.get(key)
+        if fb is None:
+            upper = self.get(top)
+            lower = self.get(bottom)
+            h = upper.h * 2 + 1
+            size = buffer_size(upper.w, h, upper.format)
+            fb = framebuf.FrameBuffer(bytearray(size), upper.w, h, upper.format)
+            fb.blit(upper.pbmPrint(), 0, 0)
+            fb.blit(lower.pbmPrint(), 0, upper.h + 1)
+            # 读取 bottom 时 top 可能已被释放，此时不保存，否则不会再随来源释放
+            if self._list[top] is not None and self._list[bottom] is not None:
+                self._strips[key] = fb
+                self.used += size
+                self._evict(bottom)
+        return fb
+
+    # 缩放图片，结果在所有控件间共享，同样大小的缩放只计算一次
+    def zoom(self, handle, w, h) -> framebuf:
+        key = (handle << 10 | w) << 10 | h
+        fb = self._zooms.get(key)
+        if fb is None:
+            pbm = self.get(handle)
+            fb = pbm.zoom(w, h)[0]
+            self._zooms[key] = fb
+            self.used += buffer_size(w, h, pbm.format)
+            self._evict(handle)
+        return fb
+
+    # 登记图片，不立即读取，返回句柄，pin 为 True 时图片读取后不会被释放
+    def add(self, filename, pin=False) -> int:
+        if filename in self._handles:
+            handle = self._handles[filename]
+        else:
+            handle = len(self._list)
+            self._handles[filename] = handle
+            self._names.append(filename)
+            self._list.append(None)
+            self._pinned.append(False)
+            self._stamps.append(0)
+        if pin:
+            self._pinned[handle] = True
+        return handle
+
+    def add_pbm(self, pbm: Pbm, pin=False) -> int:
+        handle = self.add(pbm.filename, pin)
+        self._store(handle, pbm)
+        self._touch(handle)
+        return handle
+
+    # 固定图片，不受 budget 限制
+    def pin(self, filename, flag=True):
+        self._pinned[self.add(filename)] = flag
+
+    # 释放图片，句柄仍然有效，再次使用时重新读取
     def del_pbm(self, filename):
         try:
-            del self.pbms[filename]
+            self._release(self._handles[filename])
         except:
             print('PBM: %s not load |del' % filename)
 
+    def _store(self, handle, pbm):
+        if self._list[handle] is not None:
+            self._release(handle)
+        self._list[handle] = pbm
+        self.pbms[pbm.filename] = pbm
+        self.used += len(pbm.pbm)
+        self._evict(handle)
+
+    def _release(self, handle):
+        pbm = self._list[handle]
+        del self.pbms[pbm.filename]
+        self._list[handle] = None
+        self.used -= len(pbm.pbm)
+        # 释放由这张图片生成的拼接图和缩放图，拼接的两张图片大小相同
+        for key in [key for key in self._strips if key >> 16 == handle or key & 0xffff == handle]:
+            del self._strips[key]
+            self.used -= buffer_size(pbm.w, pbm.h * 2 + 1, pbm.format)
+        for key in [key for key in self._zooms if key >> 20 == handle]:
+            del self._zooms[key]
+            self.used -= buffer_size(key >> 10 & 0x3ff, key & 0x3ff, pbm.format)
+
+    def _touch(self, handle):
+        self._stamp += 1
+        if self._stamp >= 0x3fffffff:
+            # 序号即将超出小整数范围时按原来的先后重新编号为 0..n-1，保持最久未使用的顺序
+            stamps = self._stamps
+            order = sorted(range(0, len(stamps)), key=lambda i: stamps[i])
+            for i in range(0, len(order)):
+                stamps[order[i]] = i
+            self._stamp = len(order)
+        self._stamps[handle] = self._stamp
+
+    # 超出 budget 时释放最久未使用的图片，keep 为刚刚读取的图片
+    def _evict(self, keep):
+        if self.budget is None:
+            return
+        while self.used > self.budget:
+            oldest = None
+            for handle in range(0, len(self._list)):
+                if self._list[handle] is not None and not self._pinned[handle] and handle != keep:
+                    if oldest is None or self._stamps[handle] < self._stamps[oldest]:
+                        oldest = handle
+            if oldest is None:
+                return
+            self._release(oldest)
+            self.evictions += 1
+
+    def report(self):
+        print('PBM: %d/%d loaded  strips: %d  zooms: %d  %dB used / %s budget  hits: %d  misses: %d  evictions: %d' % (
+            len(self.pbms), len(self._list), len(self._strips), len(self._zooms), self.used, self.budget,
+            self.hits, self.misses, self.evictions))
+
+
+# 显示后端: 把合成好的帧中 [x0, x1) 列发送到屏幕
+class DisplayBackend:
+    # 屏幕驱动的帧缓冲格式，图片和控件缓冲区使用相同格式
+    # 取驱动的 format 属性，驱动没有该属性时为 MONO_VLSB
+    format = framebuf.MONO_VLSB
+    # 是否支持只发送部分列，不支持时任意变化都整帧发送
+    partial = False
+    # 发送的最小列宽，例如 VFD 一个字符占 5 列
+    cell = 1
+
+    def __init__(self, display, width, height):
+        self.display = display
+        self.width = width
+        self.height = height
+        self.format = getattr(display, 'format', DisplayBackend.format)
+        self.buf = None
+        self.frame = None
+
+    # 绑定帧缓冲，由 FrameTransfer 创建时调用一次
+    def bind(self, buf):
+        self.buf = buf
+        self.frame = framebuf.FrameBuffer(buf, self.width, self.height, self.format)
+
+    def write(self, x0, x1):
+        pass
+
+    # 一帧中所有变化的列都已 write 后调用
+    def flush(self):
+        pass
+
+
+# 适配基于 framebuf 的屏幕驱动 (如 futaba_8md06inkm.VFD)，只能通过 show() 整帧发送
+class FramebufBackend(DisplayBackend):
+
+    def write(self, x0, x1):
+        self.display.blit(self.frame, 0, 0)
+
+    def flush(self):
+        self.display.show()
+
+
+# 8-MD-06INKM 按字符发送的后端 (试验中，尚未在屏幕上验证，默认仍使用 FramebufBackend)
+# 屏幕由 8 个 5x7 自定义字符 (CGRAM) 组成，每个字符占 5 列
+# 第一帧由驱动的 show() 整帧发送 (同时设置字符映射)，之后只把变化的字符写入对应的 CGRAM，再发送刷新命令
+# spi / cs 与创建 driver.VFD 时相同，命令和位序取自驱动模块 driver (如 futaba_8md06inkm):
+#   CGRAM_WRITE: CGRAM 写入命令 (加字符号，之后为 5 列数据)，DISPLAY_REFRESH: 刷新显示命令
+#   BIT_REVERSE: 发送前逐字节替换的位序表，None 时原样发送
+# 驱动模块没有这些常量时创建失败，不会发送错误的命令
+class VfdBackend(FramebufBackend):
+    partial = True
+    cell = 5
+
+    def __init__(self, display, spi, cs, driver, width=40, height=7):
+        super().__init__(display, width, height)
+        self.spi = spi
+        self.cs = cs
+        self._cgram = driver.CGRAM_WRITE
+        self._refresh = driver.DISPLAY_REFRESH
+        self._reverse = driver.BIT_REVERSE
+        self._cmd = bytearray(1 + self.cell)
+        self._show = bytearray(1)
+        self._dirty = False
+
+    def _send(self, data):
+        reverse = self._reverse
+        if reverse is not None:
+            for i in range(0, len(data)):
+                data[i] = reverse[data[i]]
+        self.cs.value(0)
+        self.spi.write(data)
+        self.cs.value(1)
+
+    def write(self, x0, x1):
+        if x0 == 0 and x1 == self.width:
+            super().write(x0, x1)
+            self._dirty = False
+            return
+        cmd = self._cmd
+        buf = self.buf
+        for x in range(x0, x1, self.cell):
+            cmd[0] = self._cgram + x // self.cell
+            for i in range(0, self.cell):
+                cmd[1 + i] = buf[x + i]
+            self._send(cmd)
+        self._dirty = True
+
+    def flush(self):
+        if self._dirty:
+            self._dirty = False
+            self._show[0] = self._refresh
+            self._send(self._show)
+        else:
+            super().flush()
+
+
+# 记录每帧发送内容的后端，用于在电脑上验证差分结果
+class RecordingBackend(DisplayBackend):
+    partial = True
+
+    def __init__(self, width, height, cell=1, display=None):
+        super().__init__(display, width, height)
+        self.cell = cell
+        self.frames = []
+        self._spans = []
+
+    # 每次写入记录为 (x0, x1, 该区间的列数据)
+    def write(self, x0, x1):
+        pages = (self.height + 7) // 8
+        data = bytearray()
+        for page in range(0, pages):
+            data += self.buf[page * self.width + x0:page * self.width + x1]
+        self._spans.append((x0, x1, bytes(data)))
+
+    def flush(self):
+        self.frames.append(self._spans)
+        self._spans = []
+
+
+# 帧差分传输: 保存上一次发送的帧，只发送变化的列
+class FrameTransfer:
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.width = backend.width
+        self.pages = (backend.height + 7) // 8
+        self.buf = bytearray(buffer_size(backend.width, backend.height, backend.format))
+        self.frame = framebuf.FrameBuffer(self.buf, backend.width, backend.height, backend.format)
+        # 只有 MONO_VLSB 的帧按列存放 (每页 width 字节)，可以逐列比较，其他格式整帧比较和发送
+        self._columns = backend.format == framebuf.MONO_VLSB
+        self._last = bytearray(len(self.buf))
+        self._synced = False
+        backend.bind(self.buf)
+        # 统计: 最近一帧及累计发送/节省的字节数
+        self.frames = 0
+        self.lastSent = 0
+        self.lastSaved = 0
+        self.totalSent = 0
+        self.totalSaved = 0
+
+    def _changed(self, x0, x1):
+        buf = self.buf
+        last = self._last
+        if not self._columns:
+            for i in range(0, len(buf)):
+                if buf[i] != last[i]:
+                    return True
+            return False
+        for page in range(0, self.pages):
+            i = page * self.width
+            for x in range(i + x0, i + x1):
+                if buf[x] != last[x]:
+                    return True
+        return False
+
+    # 逐字节复制，切片赋值会分配临时 bytearray
+    def _commit(self, x0, x1):
+        buf = self.buf
+        last = self._last
+        if not self._columns:
+            for i in range(0, len(buf)):
+                last[i] = buf[i]
+            return
+        for page in range(0, self.pages):
+            i = page * self.width
+            for x in range(i + x0, i + x1):
+                last[x] = buf[x]
+
+    # 发送当前帧，返回发送的字节数，帧未变化时不访问屏幕
+    def send(self):
+        backend = self.backend
+        width = self.width
+        cell = backend.cell
+        sent = 0
+        if not self._synced:
+            backend.write(0, width)
+            self._commit(0, width)
+            self._synced = True
+            sent = width
+        elif backend.partial and self._columns:
+            start = -1
+            for x in range(0, width, cell):
+                end = x + cell
+                if end > width:
+                    end = width
+                if self._changed(x, end):
+                    if start < 0:
+                        start = x
+                elif start >= 0:
+                    backend.write(start, x)
+                    self._commit(start, x)
+                    sent += x - start
+                    start = -1
+            if start >= 0:
+                backend.write(start, width)
+                self._commit(start, width)
+                sent += width - start
+        elif self._changed(0, width):
+            backend.write(0, width)
+            self._commit(0, width)
+            sent = width
+        if sent:
+            backend.flush()
+        sent = sent * self.pages if self._columns else (len(self.buf) if sent else 0)
+        self.frames += 1
+        self.lastSent = sent
+        self.lastSaved = len(self.buf) - sent
+        self.totalSent += sent
+        self.totalSaved += self.lastSaved
+        return sent
+
+    # 打印传输统计，spi_freq 用于估算节省的 SPI 时间
+    def report(self, spi_freq=5000000):
+        print('frames: %d  last sent: %dB saved: %dB  total sent: %dB saved: %dB (%dus @ %dHz)' % (
+            self.frames, self.lastSent, self.lastSaved, self.totalSent, self.totalSaved,
+            self.totalSaved * 8 * 1000000 // spi_freq, spi_freq))
+
+
+# 帧录制: 把每次合成的帧和时间戳写入录像文件，由 host/replay.py 回放和逐帧比较
+# 文件头 '<4sBHH': MAGIC, VERSION, 宽, 高，帧数据与 FrameTransfer 相同为 MONO_VLSB
+# 每帧 '<IH': 开始录制以来的毫秒数, 数据长度，数据为与上一帧异或后的游程编码:
+#   重复 (不变的字节数, 变化的字节数, 变化字节的异或值...)，两个计数各占一字节，最大 255
+#   数据长度为 0 表示这一帧合成了但像素与上一帧相同
+class FrameRecorder:
+    MAGIC = b'PYMR'
+    VERSION = 1
+
+    def __init__(self, stream, width, height):
+        self.stream = stream
+        self.size = width * ((height + 7) // 8)
+        self._last = bytearray(self.size)
+        # 最坏情况为变化和不变的字节交替出现，每个变化字节前有两个计数
+        self._out = bytearray(self.size * 3)
+        self._head = bytearray(6)
+        self._start = time.ticks_ms()
+        # 统计: 录制的帧数、其中像素变化的帧数、写入的字节数
+        self.frames = 0
+        self.changed = 0
+        self.written = 9
+        stream.write(struct.pack('<4sBHH', self.MAGIC, self.VERSION, width, height))
+
+    def record(self, buf):
+        last = self._last
+        out = self._out
+        size = self.size
+        n = 0
+        i = 0
+        while i < size:
+            skip = 0
+            while i < size and buf[i] == last[i]:
+                i += 1
+                skip += 1
+            if i == size:
+                break
+            while skip > 255:
+                out[n] = 255
+                out[n + 1] = 0
+                n += 2
+                skip -= 255
+            start = i
+            end = i + 255
+            if end > size:
+                end = size
+            while i < end and buf[i] != last[i]:
+                i += 1
+            out[n] = skip
+            out[n + 1] = i - start
+            n += 2
+            for j in range(start, i):
+                out[n] = buf[j] ^ last[j]
+                last[j] = buf[j]
+                n += 1
+        struct.pack_into('<IH', self._head, 0, time.ticks_diff(time.ticks_ms(), self._start), n)
+        self.stream.write(self._head)
+        if n:
+            self.stream.write(memoryview(out)[:n])
+            self.changed += 1
+        self.frames += 1
+        self.written += 6 + n
+
+    def close(self):
+        self.stream.close()
+
+    def report(self):
+        print('recorded frames: %d  changed: %d  %dB' % (self.frames, self.changed, self.written))
+
+
+# 逐控件耗时统计: 记录每个控件 gui_update / gui_show 以及刷新屏幕所用的微秒数
+# 每项保留最近 size 帧的样本，样本存放在预先分配的数组中，记录时不分配内存
+class Profiler:
+
+    def __init__(self, size=32, overlay=False):
+        self.size = size
+        self.overlay = overlay
+        self.names = []
+        self.kinds = []
+        self._wrapped = []
+        self.cullSlot = 0
+        self._samples = array('L')
+        self._pos = array('H')
+        self._count = array('H')
+
+    # 遍历控件树，把各控件的 gui_update / gui_show 替换为计时版本，之后新增的控件需要重新调用
+    def attach(self, gui):
+        self.detach()
+        name = type(gui).__name__
+        self._wrap(gui, 'window_update', name, 'update', 0)
+        self._wrap(gui, 'show', name, 'show', 0)
+        self._wrap(gui.transfer, 'send', type(gui.transfer).__name__, 'send', 1)
+        self._wrap(gui.transfer.backend, 'flush', type(gui.transfer.backend).__name__, 'flush', 2)
+        self._walk(gui.windows, 1)
+        # 每帧跳过的控件数，不是耗时
+        self.cullSlot = len(self.names)
+        self.names.append('culled')
+        self.kinds.append('count')
+        slots = len(self.names)
+        self._samples = array('L', [0] * (slots * self.size))
+        self._pos = array('H', [0] * slots)
+        self._count = array('H', [0] * slots)
+
+    def _walk(self, widgets, depth):
+        for widget in widgets:
+            name = type(widget).__name__
+            self._wrap(widget, 'gui_update', name, 'update', depth)
+            self._wrap(widget, 'gui_show', name, 'show', depth)
+            if hasattr(widget, 'widgets'):
+                self._walk(widget.widgets, depth + 1)
+
+    def _wrap(self, obj, attr, name, kind, depth):
+        slot = len(self.names)
+        self.names.append('  ' * depth + name)
+        self.kinds.append(kind)
+        self._wrapped.append((obj, attr))
+        fn = getattr(obj, attr)
+        record = self.record
+        ticks_us = time.ticks_us
+        ticks_diff = time.ticks_diff
+
+        def timed():
+            start = ticks_us()
+            res = fn()
+            record(slot, ticks_diff(ticks_us(), start))
+            return res
+
+        setattr(obj, attr, timed)
+
+    # 恢复被替换的方法
+    def detach(self):
+        for obj, attr in self._wrapped:
+            delattr(obj, attr)
+        self._wrapped = []
+        self.names = []
+        self.kinds = []
+
+    def record(self, slot, us):
+        i = self._pos[slot]
+        self._samples[slot * self.size + i] = us
+        i += 1
+        if i == self.size:
+            i = 0
+        self._pos[slot] = i
+        if self._count[slot] < self.size:
+            self._count[slot] += 1
+
+    # 最近一次记录的耗时
+    def last(self, slot):
+        if self._count[slot] == 0:
+            return 0
+        i = self._pos[slot] - 1
+        if i < 0:
+            i = self.size - 1
+        return self._samples[slot * self.size + i]
+
+    # 返回 (样本数, min, avg, max, p95)
+    def stats(self, slot):
+        n = self._count[slot]
+        if n == 0:
+            return (0, 0, 0, 0, 0)
+        start = slot * self.size
+        samples = sorted(self._samples[start:start + n])
+        return (n, samples[0], sum(samples) // n, samples[-1], samples[(n * 95 + 99) // 100 - 1])
+
+    # 打印各控件耗时表，单位为微秒，Window 的耗时包含其子控件，最后一行 culled 为每帧跳过的控件数
+    def dump(self):
+        print('%-24s %-6s %4s %6s %6s %6s %6s' % ('widget', 'call', 'n', 'min', 'avg', 'max', 'p95'))
+        for slot in range(0, len(self.names)):
+            n, low, avg, high, p95 = self.stats(slot)
+            if n > 0:
+                print('%-24s %-6s %4d %6d %6d %6d %6d' % (self.names[slot], self.kinds[slot], n, low, avg, high, p95))
+
+    # 在左上角 32x8 区域显示上一帧 update + show 的耗时 (ms)，超过刷新间隔时反色
+    # 第 4 个字符为上一帧跳过的控件数，超过 9 个时显示 +
+    def drawOverlay(self, frame, budget_ms):
+        us = self.last(0) + self.last(1)
+        if us < 10000:
+            text = '%d.%d' % (us // 1000, us // 100 % 10)
+        else:
+            text = str(us // 1000)
+        culled = self.last(self.cullSlot)
+        c = 1 if us > budget_ms * 1000 else 0
+        frame.fill_rect(0, 0, 32, 8, c)
+        frame.text(text, 0, 0, 1 - c)
+        frame.text(str(culled) if culled < 10 else '+', 24, 0, 1 - c)
+
+
+# Pymg 的刷新档位
+TIER_MOTION = 0
+TIER_IDLE = 1
+
 
 class Pymg:
 
+    # display 可以是屏幕驱动，也可以是 DisplayBackend
     def __init__(self, display, display_info, refresh_interval=30, fps=False):
-        self.display = display
+        if isinstance(display, DisplayBackend):
+            backend = display
+        else:
+            backend = FramebufBackend(display, display_info[0], display_info[1])
+        self.display = backend.display
+        setFormat(backend.format)
+        self.transfer = FrameTransfer(backend)
+        self.frame = self.transfer.frame
         self.display_info = display_info
         self.refresh_interval = refresh_interval
-        self._fps = fps
-        self.fps = 0
         self.wlan = network.WLAN(network.STA_IF)
         self.wlan.active(False)
         self.windows = []
         self.showWindows = []
+        # 窗口增删或显示状态改变后才重新生成 showWindows
+        self._showChanged = True
         self.last_show_time = time.ticks_ms()
+        self.dirtyRect = DirtyRect()
+        self.dirtyRect.add(0, 0, display_info[0], display_info[1])
+        # 没有控件请求更新时的最长休眠时间
+        self.idle_interval = 1000
+        # 休眠期间检查输入中断的间隔
+        self.input_poll = 10
+        # 没有动画时检查输入中断的间隔，lightsleep 也只在没有动画时使用
+        self.idle_poll = 50
+        self.lightsleep = False
+        self.wakeups = 0
+        # 刷新档位: 有控件报告动画 (reportMotion) 时为 TIER_MOTION，按 refresh_interval 刷新
+        # 否则为 TIER_IDLE，只在控件请求的截止时间刷新，如时钟每秒一次、冒号每秒两次
+        self.tier = TIER_IDLE
+        self._motion = False
+        self._tierStamp = time.ticks_ms()
+        # 各档位累计的时间 (ms)、刷新帧数和唤醒次数
+        self.tierTime = [0, 0]
+        self.tierFrames = [0, 0]
+        self.tierWakeups = [0, 0]
+        self._sleep = 0
+        # 同步模式下等待执行的耗时任务
+        self._jobs = []
+        self._asyncio = None
+        # fps 为 True 时开启耗时统计并在左上角显示帧耗时
+        self.profiler = None
+        if fps:
+            self.setProfile(True, overlay=True)
+        # 帧录制，见 record()
+        self.recorder = None
 
     '''
     window : 窗口对象
@@ -100,21 +1183,36 @@ class Pymg:
                 self.windows.insert(0, window)
         else:
             self.windows.insert(insert, window)
+        self.treeChanged()
+        self.invalidate(window.x, window.y, window.w, window.h)
 
     # 移除窗口
     def widgetDel(self, window):
         self.windows.remove(window)
+        self.treeChanged()
+        self.invalidate(window.x, window.y, window.w, window.h)
+
+    # 窗口增删或 hidden 改变
+    def treeChanged(self):
+        self._showChanged = True
+
+    # 标记屏幕上需要重绘的区域
+    def invalidate(self, x, y, w, h):
+        self.dirtyRect.add(x, y, w, h)
 
     # 获取传入窗口下标
     def getWidgetIndex(self, window):
         return self.windows.index(window)
 
-    # 获取需要显示的窗口
+    # 获取需要显示的窗口 (按层叠顺序)，只在窗口增删或 hidden 改变后重新生成
     def getShowWindows(self):
-        self.showWindows.clear()
-        for window in self.windows:
-            if not window.hidden:
-                self.showWindows.append(window)
+        if self._showChanged:
+            self._showChanged = False
+            self.showWindows.clear()
+            for window in self.windows:
+                if not window.hidden:
+                    self.showWindows.append(window)
+        return self.showWindows
 
     def getDisplay(self):
         return self.display
@@ -124,85 +1222,338 @@ class Pymg:
 
     # 更新窗口
     def window_update(self):
-        # if not self.now_show:
-        # self.getShowWindows()
-        # 遍历 当前显示的窗口， 刷新
-        # for window in self.showWindows:
-        #    window.gui_update()
-        for window in self.windows:
-            if not window.hidden:
+        # 遍历 当前显示的窗口， 刷新，完全在屏幕之外的窗口跳过
+        w, h = self.display_info
+        for window in self.getShowWindows():
+            if window.outside(w, h):
+                _cull()
+            else:
                 window.gui_update()
 
+    # 只重绘脏区域，再由 FrameTransfer 只发送变化的列，没有变化时不刷新屏幕
     def show(self):
-        self.display.fill(0)
-        for window in self.showWindows:
-            res = window.gui_show()
-            self.display.blit(res[0], res[1], res[2], res[3])
-        if self._fps:
-            self.display.fill_rect(0, 0, 24, 8, 0)
-            self.display.text(str(self.fps), 0, 0)
-        self.display.show()
-
-    def start(self):
-        while True:
-            self.window_update()
+        rect = self.dirtyRect
+        if rect.isEmpty():
+            return False
+        profiler = self.profiler
+        if profiler is not None and profiler.overlay:
+            rect.add(0, 0, 32, 8)
+        frame = self.frame
+        windows = self.getShowWindows()
+        rect.cover(windows)
+        rect.clip(self.display_info[0], self.display_info[1])
+        rect.fill(frame)
+        for window in windows:
+            if rect.intersects(window.x, window.y, window.w, window.h):
+                render = window.gui_show()
+                frame.blit(render[0], render[1], render[2], render[3])
+        if profiler is not None:
+            profiler.record(profiler.cullSlot, _culled)
+            if profiler.overlay:
+                profiler.drawOverlay(frame, self.refresh_interval)
+        rect.clear()
+        if self.recorder is not None:
+            self.recorder.record(self.transfer.buf)
+        self.transfer.send()
+        return True
+
+    # 控件请求在 ms 毫秒后再次更新，本轮取最早的截止时间
+    def requestUpdate(self, ms):
+        if ms < self._sleep:
+            self._sleep = ms
+
+    # 控件在本轮更新中正在播放动画 (翻页、数字滚动等)
+    def reportMotion(self):
+        self._motion = True
+
+    # 更新一轮并在需要时刷新屏幕，返回距离最早截止时间的毫秒数
+    def step(self):
+        global _wake, _culled
+        _wake = False
+        # 不刷新屏幕的轮次也清零，记录的是刷新那一轮的跳过数
+        _culled = 0
+        now_time = time.ticks_ms()
+        self.tierTime[self.tier] += time.ticks_diff(now_time, self._tierStamp)
+        self._tierStamp = now_time
+        self._sleep = self.idle_interval
+        self._motion = False
+        self.wakeups += 1
+        if len(_button_events) > 0:
+            self._dispatchButtons()
+        for encoder in _encoders:
+            encoder.poll()
+        self.window_update()
+        self.tier = TIER_MOTION if self._motion else TIER_IDLE
+        self.tierWakeups[self.tier] += 1
+        if not self.dirtyRect.isEmpty():
             now_time = time.ticks_ms()
             interval = time.ticks_diff(now_time, self.last_show_time)
             if interval >= self.refresh_interval:
-                self.getShowWindows()
                 self.last_show_time = now_time
-                if self._fps:
-                    self.fps = int(1000 / interval)
                 self.show()
+                self.tierFrames[self.tier] += 1
+            else:
+                self.requestUpdate(self.refresh_interval - interval)
+        # 等待界面变化显示后再执行耗时任务
+        if len(self._jobs) > 0 and self.dirtyRect.isEmpty():
+            self._runJobs()
+        return self._sleep
+
+    # 休眠 ms 毫秒，期间有输入中断时提前返回
+    def idle(self, ms):
+        deadline = time.ticks_add(time.ticks_ms(), ms)
+        motion = self.tier == TIER_MOTION
+        poll = self.input_poll if motion else self.idle_poll
+        while not _wake:
+            remain = time.ticks_diff(deadline, time.ticks_ms())
+            if remain <= 0:
+                break
+            if remain > poll:
+                remain = poll
+            if self.lightsleep and not motion:
+                lightsleep(remain)
+            else:
+                time.sleep_ms(remain)
+
+    # 打印各刷新档位的时间占比、帧率和唤醒次数，用于估算空闲时节省的 CPU 和功耗
+    def tierReport(self):
+        total = self.tierTime[0] + self.tierTime[1]
+        for tier in (TIER_MOTION, TIER_IDLE):
+            ms = self.tierTime[tier]
+            frames = self.tierFrames[tier]
+            print('%-6s %8dms %3d%%  frames: %6d  fps: %5.1f  wakeups/s: %5.1f' % (
+                ('motion', 'idle')[tier], ms, ms * 100 // total if total else 0, frames,
+                frames * 1000 / ms if ms else 0, self.tierWakeups[tier] * 1000 / ms if ms else 0))
+
+    def resetTiers(self):
+        for tier in (TIER_MOTION, TIER_IDLE):
+            self.tierTime[tier] = 0
+            self.tierFrames[tier] = 0
+            self.tierWakeups[tier] = 0
+
+    # 开启或关闭耗时统计，size 为每项保留的帧数，overlay 为 True 时在屏幕左上角显示帧耗时
+    # 在 REPL 中可调用 gui.dumpProfile() 打印各控件耗时
+    def setProfile(self, flag: bool, overlay=False, size=32):
+        if self.profiler is not None:
+            self.profiler.detach()
+            self.profiler = None
+        if flag:
+            self.profiler = Profiler(size, overlay)
+            self.profiler.attach(self)
+        self.invalidate(0, 0, 32, 8)
 
-
+    def dumpProfile(self):
+        if self.profiler is None:
+            print('profile not enabled')
+        else:
+            self.profiler.dump()
+
+    # 把之后合成的每一帧写入录像文件 file，stopRecord() 结束录制
+    # 录像可在电脑上用 python -m host.replay 查看，或与另一次录制逐帧比较
+    def record(self, file='frames.rec'):
+        self.stopRecord()
+        self.recorder = FrameRecorder(open(file, 'wb'), self.display_info[0], self.display_info[1])
+        # 第一帧为完整画面
+        self.invalidate(0, 0, self.display_info[0], self.display_info[1])
+
+    def stopRecord(self):
+        recorder = self.recorder
+        if recorder is not None:
+            self.recorder = None
+            recorder.close()
+            recorder.report()
+        return recorder
+
+    # spin 为 True 时不休眠，与旧的忙等循环相同
+    def start(self, spin=False):
+        if self.profiler is not None:
+            self.profiler.attach(self)
+        while True:
+            sleep = self.step()
+            if not spin:
+                self.idle(sleep)
+
+    # 以 asyncio 任务方式运行: asyncio.run(gui.start_async())
+    # 渲染在一个任务中按截止时间执行，输入中断通过 ThreadSafeFlag 唤醒，耗时任务由 runTask 并发执行
+    async def start_async(self):
+        global _flag
+        asyncio = _asyncio()
+        self._asyncio = asyncio
+        if hasattr(asyncio, 'ThreadSafeFlag'):
+            _flag = asyncio.ThreadSafeFlag()
+        else:
+            _flag = _Flag(asyncio)
+        if self.profiler is not None:
+            self.profiler.attach(self)
+        jobs = self._jobs
+        self._jobs = []
+        for job in jobs:
+            self.runTask(job[0], *job[1])
+        try:
+            while True:
+                sleep = self.step()
+                await _wait_ms(asyncio, _flag, sleep)
+        finally:
+            _flag = None
+            self._asyncio = None
+
+    # 运行耗时任务 (网络请求等)，fn 可以是普通函数或 async 函数
+    # 同步模式下在本轮刷新屏幕之后执行，asyncio 模式下作为独立任务与渲染并发执行
+    def runTask(self, fn, *args):
+        if self._asyncio is None:
+            self._jobs.append((fn, args))
+            wake()
+        else:
+            self._asyncio.create_task(self._task(fn, args))
+
+    async def _task(self, fn, args):
+        # 等待一帧，保证调用前的界面变化已经显示
+        await _sleep_ms(self._asyncio, self.refresh_interval)
+        res = fn(*args)
+        if hasattr(res, 'send'):
+            await res
+        wake()
+
+    def _runJobs(self):
+        jobs = self._jobs
+        self._jobs = []
+        for job in jobs:
+            res = job[0](*job[1])
+            if hasattr(res, 'send'):
+                _asyncio().run(res)
+        self.requestUpdate(0)
+
+    def _dispatchButtons(self):
+        while len(_button_events) > 0:
+            button, msg = _button_events.pop(0)
+            button.callback(button.pin, msg)
+
+
+# 按键事件，作为 msg 传给 connect() 设置的回调
+BUTTON_CLICK = 0
+BUTTON_LONG_PRESS = 1
+# 以下两种事件需要分别用 setDoubleClick() / setRepeat() 开启
+BUTTON_DOUBLE_CLICK = 2
+BUTTON_REPEAT = 3
+
+
+# 按键: 引脚中断记录按下和松开的时间 (ticks_ms)，只在按下时启动一次长按定时器，不再轮询引脚
+# 按下 single_click_time ms 内松开为单击，按住 long_press_time ms 为长按，介于两者之间的忽略
+# 两次边沿间隔小于 debounce ms 视为抖动
+# 事件由 micropython.schedule() 在中断之外放入队列，在下一轮 step() 开始时交给 connect() 设置的回调
 class Button:
 
-    def __init__(self, pin, single_click_time=130, long_press_time=210, pull=Pin.PULL_UP, trigger=Pin.IRQ_FALLING):
+    def __init__(self, pin, single_click_time=260, long_press_time=420, pull=Pin.PULL_UP, trigger=Pin.IRQ_FALLING,
+                 debounce=10):
         self.pin = pin
         self.callback = None
         self.isEnable = False
         self._single_click_time = single_click_time
         self._long_press_time = long_press_time
-        self._timer_count = 0
+        self._debounce = debounce
+        self._double_click_time = 0
+        self._repeat_time = 0
         self.button = Pin(pin, Pin.IN, pull)
         self.trigger = trigger
-        self._long_press_timer = Timer(0)
+        # trigger 为按下时的边沿
+        self._press_level = 0 if trigger == Pin.IRQ_FALLING else 1
+        self._pressed = False
+        self._long = False
+        self._pending = False
+        self._press_time = 0
+        self._edge_time = time.ticks_add(time.ticks_ms(), -debounce)
+        self._timer = Timer(0)
+        # 中断中不能分配内存，预先绑定方法
+        self._edge_ref = self._edge
+        self._timeout_ref = self._timeout
+        self._deliver_ref = self._deliver
 
     def setEnable(self, flag: bool):
         if flag:
-            self.button.irq(handler=self._irq_callback, trigger=self.trigger)
+            self._pressed = self.button.value() == self._press_level
+            self._long = self._pressed
+            self._pending = False
+            self.button.irq(handler=self._edge_ref, trigger=Pin.IRQ_RISING | Pin.IRQ_FALLING)
             self.isEnable = True
         else:
             self.button.irq(handler=None)
+            self._timer.deinit()
             self.isEnable = False
 
     def connect(self, fun):
         self.callback = fun
 
-    def _irq_callback(self, pin):
-        self.setEnable(False)
-        self.click_flag = False
-        self.long_press_flag = False
-        self._long_press_timer.init(period=2, callback=self._timer_irp_callback)
-
-    def _timer_irp_callback(self, msg):
-        if self.button.value() != 0 or self._timer_count > self._long_press_time + 10:
-            print(self._timer_count)
-            if 5 < self._timer_count < self._single_click_time:
-                self._long_press_timer.deinit()
-                print('Button %s clicked' % str(self.pin))
-                self.callback(self.pin, 0)
-            elif self._timer_count > self._long_press_time:
-                self._long_press_timer.deinit()
-                print('Button %s long pressed' % str(self.pin))
-                self.callback(self.pin, 1)
-            else:
-                self._long_press_timer.deinit()
-            self._timer_count = 0
-            self.setEnable(True)
+    # 开启双击: 松开后 ms 毫秒内再次单击为双击，单击事件因此推迟 ms 毫秒，0 关闭
+    def setDoubleClick(self, ms):
+        self._double_click_time = ms
+
+    # 开启长按连发: 长按之后每 ms 毫秒发送一次 BUTTON_REPEAT 直到松开，0 关闭
+    def setRepeat(self, ms):
+        self._repeat_time = ms
+
+    def _oneShot(self, ms):
+        self._timer.init(mode=Timer.ONE_SHOT, period=ms, callback=self._timeout_ref)
+
+    # 引脚中断，按下和松开都会触发
+    def _edge(self, pin):
+        now = time.ticks_ms()
+        pressed = self.button.value() == self._press_level
+        if pressed == self._pressed or time.ticks_diff(now, self._edge_time) < self._debounce:
+            return
+        self._edge_time = now
+        self._pressed = pressed
+        if pressed:
+            self._press_time = now
+            self._long = False
+            self._oneShot(self._long_press_time)
+            return
+        self._timer.deinit()
+        if self._long:
+            return
+        if time.ticks_diff(now, self._press_time) >= self._single_click_time:
+            self._flush()
+        elif self._double_click_time == 0:
+            self._emit(BUTTON_CLICK)
+        elif self._pending:
+            self._pending = False
+            self._emit(BUTTON_DOUBLE_CLICK)
         else:
-            self._timer_count += 1
+            self._pending = True
+            self._oneShot(self._double_click_time)
+
+    # 定时器中断: 长按时间到、连发或双击等待结束
+    def _timeout(self, timer):
+        if not self._pressed:
+            self._flush()
+        elif self.button.value() != self._press_level:
+            # 松开的边沿在防抖时间内被忽略了
+            self._pressed = False
+            self._flush()
+        elif self._long:
+            self._emit(BUTTON_REPEAT)
+        else:
+            self._flush()
+            self._long = True
+            self._emit(BUTTON_LONG_PRESS)
+            if self._repeat_time > 0:
+                self._timer.init(mode=Timer.PERIODIC, period=self._repeat_time, callback=self._timeout_ref)
+
+    # 发出等待双击的单击
+    def _flush(self):
+        if self._pending:
+            self._pending = False
+            self._emit(BUTTON_CLICK)
+
+    def _emit(self, msg):
+        try:
+            micropython.schedule(self._deliver_ref, msg)
+        except RuntimeError:
+            pass
+
+    # 由 micropython.schedule() 调用，可能发生在 step() 中途，只排队并唤醒主循环
+    def _deliver(self, msg):
+        _button_events.append((self, msg))
+        wake()
 
 
 class Signal:
@@ -226,11 +1577,50 @@ class Widget:
     def __init__(self, parant, window_info, insert=None, loc="Top", brackGround=-1):
         self.x, self.y, self.w, self.h = window_info
         self.parant = parant
+        self._hidden = False
+        self.dirty = True
         self.parant.widgetAdd(self, insert, loc)
-        self.hidden = False
         self.isCheckable = False
         self.brackGround = brackGround
-        self.buffer = framebuf.FrameBuffer(bytearray((self.h * self.w) // 8), self.w, self.h, framebuf.MONO_HMSB)
+        self.data = bytearray(buffer_size(self.w, self.h, _format))
+        self.buffer = framebuf.FrameBuffer(self.data, self.w, self.h, _format)
+        # 渲染描述 (buffer, x, y, 透明色)，gui_show 每次返回同一个元组，不在每帧分配
+        self.render = (self.buffer, self.x, self.y, self.brackGround)
+
+    @property
+    def hidden(self):
+        return self._hidden
+
+    @hidden.setter
+    def hidden(self, flag):
+        if flag != self._hidden:
+            self._hidden = flag
+            self.parant.treeChanged()
+            self.parant.invalidate(self.x, self.y, self.w, self.h)
+
+    # 反转缓冲区中的矩形区域，用于高亮、光标和闪烁
+    def invert(self, x, y, w, h):
+        invert_rect(self.data, self.w, self.h, _format, x, y, w, h)
+
+    # 是否完全在 (0, 0, w, h) 之外，用于跳过父窗口中看不到的控件
+    def outside(self, w, h):
+        return self.x >= w or self.y >= h or self.x + self.w <= 0 or self.y + self.h <= 0
+
+    # 移动控件，同时更新渲染描述
+    def setPos(self, x, y):
+        self.x = x
+        self.y = y
+        self.render = (self.buffer, x, y, self.brackGround)
+
+    # 标记自身 (或自身坐标下的一块区域) 需要重绘，并逐级上报给父窗口
+    def invalidate(self, x=0, y=0, w=None, h=None):
+        self.dirty = True
+        if w is None:
+            w = self.w
+        if h is None:
+            h = self.h
+        if not self._hidden:
+            self.parant.invalidate(self.x + x, self.y + y, w, h)
 
     # 接受 更新信号 并处理
     def gui_update(self):
@@ -245,6 +1635,17 @@ class Widget:
     def getDisplay(self):
         return self.parant.getDisplay()
 
+    # 请求在 ms 毫秒后再次调用 gui_update
+    def requestUpdate(self, ms):
+        self.parant.requestUpdate(ms)
+
+    # 报告本轮正在播放动画，Pymg 据此切换到最高刷新率
+    def reportMotion(self):
+        self.parant.reportMotion()
+
+    def runTask(self, fn, *args):
+        self.parant.runTask(fn, *args)
+
     def buttonCallback(self, pin, msg):
         if msg == 0:
             print('%s : button callback not set | Pin call : %s' % self, pin)
@@ -253,7 +1654,7 @@ class Widget:
 
     # 接受 画面渲染信号 并处理
     def gui_show(self) -> (framebuf, int, int, int):
-        return (self.buffer, self.x, self.y, self.brackGround)
+        return self.render
 
 
 class Window(Widget):
@@ -261,6 +1662,13 @@ class Window(Widget):
     def __init__(self, parant, window_info, insert=None, loc="Top", brackGround=-1):
         super().__init__(parant, window_info, insert, loc, brackGround)
         self.widgets = []
+        # 可见的子控件 (按层叠顺序)，子控件增删或 hidden 改变后重新生成
+        self.visibleWidgets = []
+        self._visibleChanged = False
+        self.dirtyRect = DirtyRect()
+        self.dirtyRect.add(0, 0, self.w, self.h)
+        # 最近一次重绘的区域
+        self.drawnRect = DirtyRect()
 
     def widgetAdd(self, window, insert=None, loc='Top'):
         if insert == None:
@@ -270,10 +1678,36 @@ class Window(Widget):
                 self.widgets.insert(0, window)
         else:
             self.widgets.insert(insert, window)
+        self.treeChanged()
+        self.invalidate(window.x, window.y, window.w, window.h)
 
     # 移除窗口
     def widgetDel(self, window):
         self.widgets.remove(window)
+        self.treeChanged()
+        self.invalidate(window.x, window.y, window.w, window.h)
+
+    # 子控件增删或 hidden 改变
+    def treeChanged(self):
+        self._visibleChanged = True
+
+    def getVisibleWidgets(self):
+        if self._visibleChanged:
+            self._visibleChanged = False
+            visible = self.visibleWidgets
+            visible.clear()
+            for widget in self.widgets:
+                if not widget.hidden:
+                    visible.append(widget)
+        return self.visibleWidgets
+
+    def invalidate(self, x=0, y=0, w=None, h=None):
+        if w is None:
+            w = self.w
+        if h is None:
+            h = self.h
+        self.dirtyRect.add(x, y, w, h)
+        super().invalidate(x, y, w, h)
 
     # 获取传入窗口下标
     def getWidgetIndex(self, window):
@@ -283,11 +1717,13 @@ class Window(Widget):
     def gui_update(self):
         # 更新自身及子窗口状态
         self.update()
-        widgets = self.widgets
-        if len(widgets) > 0:
-            for widget in widgets:
-                if not widget.hidden:
-                    widget.gui_update()
+        w = self.w
+        h = self.h
+        for widget in self.getVisibleWidgets():
+            if widget.outside(w, h):
+                _cull()
+            else:
+                widget.gui_update()
 
     def buttonCallback(self, pin, msg):
         if msg == 0:
@@ -300,22 +1736,119 @@ class Window(Widget):
         pass
         # 需要重构
 
+    # 清空脏区域并重新贴上与之相交的子控件，没有脏区域时返回 False
+    def _compose(self):
+        rect = self.dirtyRect
+        if rect.isEmpty():
+            return False
+        widgets = self.getVisibleWidgets()
+        rect.cover(widgets)
+        rect.clip(self.w, self.h)
+        rect.fill(self.buffer)
+        for widget in widgets:
+            if rect.intersects(widget.x, widget.y, widget.w, widget.h):
+                render = widget.gui_show()
+                self.buffer.blit(render[0], render[1], render[2], render[3])
+        self.drawnRect.copy(rect)
+        rect.clear()
+        self.dirty = False
+        return True
+
+    # 在 show() 中调用时只反转本次重绘的区域，其余部分仍是上一次反转后的内容，再次异或会还原
+    def invert(self, x, y, w, h):
+        drawn = self.drawnRect
+        x0 = x if x > drawn.x0 else drawn.x0
+        y0 = y if y > drawn.y0 else drawn.y0
+        x1 = x + w if x + w < drawn.x1 else drawn.x1
+        y1 = y + h if y + h < drawn.y1 else drawn.y1
+        invert_rect(self.data, self.w, self.h, _format, x0, y0, x1 - x0, y1 - y0)
+
     # 接受 画面渲染信号 并处理
     def gui_show(self):
-        self.buffer.fill(0)
-        self.show()
-        widgets = self.widgets
-        if len(widgets) > 0:
-            for widget in widgets:
-                if not widget.hidden:
-                    res = widget.gui_show()
-                    self.buffer.blit(res[0], res[1], res[2], res[3])
-        return (self.buffer, self.x, self.y, self.brackGround)
+        if self._compose():
+            self.show()
+        return self.render
 
+    # 在子控件之上绘制窗口自身的内容，只在重绘时调用
     def show(self):
         pass
 
 
+# 旋转编码器服务: 每对引脚只创建一个 RotaryIRQ，引脚和中断只在创建时设置一次
+# 中断中解码并把每一步的 (方向, ticks_us) 写入 RotaryIRQ 的环形缓冲区，主循环每轮由 poll() 取出交给当前租约
+# 各窗口的 Rotary 是编码器上的租约，保存各自的数值和范围设置，acquire() 只切换 RotaryIRQ 的设置，不重新配置引脚
+class RotaryEncoder:
+    EVENTS = 32
+
+    def __init__(self, clk, dt):
+        self.clk = clk
+        self.dt = dt
+        self.rotary = RotaryIRQ(pin_num_clk=clk, pin_num_dt=dt, reverse=False, half_step=True)
+        self.rotary.add_listener(self._notify)
+        self.lease = None
+        self.deltas = array('h', bytes(2 * self.EVENTS))
+        self.times = array('L', [0] * self.EVENTS)
+        # 切换租约的次数
+        self.switches = 0
+
+    # 由 micropython.schedule() 在中断之外调用
+    def _notify(self):
+        wake()
+        lease = self.lease
+        if lease is not None:
+            for listener in lease.listeners:
+                listener()
+
+    # 切换为 lease 的设置，之前的租约保存当前数值后失效
+    def acquire(self, lease):
+        if self.lease is lease:
+            return
+        self.release(self.lease)
+        self.rotary.load(lease._value, lease._min, lease._max, lease._incr, lease._mode, lease._accel)
+        # 丢弃之前未取出的事件
+        self.rotary.flush()
+        self.lease = lease
+        self.switches += 1
+
+    def release(self, lease):
+        if lease is not None and self.lease is lease:
+            lease._value = self.rotary.value()
+            lease.steps = 0
+            lease.count = 0
+            self.lease = None
+
+    # 取出中断记录的转动事件交给当前租约，由 Pymg.step() 在更新控件前调用
+    def poll(self):
+        count = self.rotary.read(self.deltas, self.times)
+        lease = self.lease
+        if lease is None:
+            return
+        steps = 0
+        for i in range(0, count):
+            steps += self.deltas[i]
+        lease.count = count
+        lease.steps = steps
+
+
+# 获取 clk / dt 引脚上的编码器服务，第一次调用时创建
+def getEncoder(clk=21, dt=22):
+    for encoder in _encoders:
+        if encoder.clk == clk and encoder.dt == dt:
+            return encoder
+    encoder = RotaryEncoder(clk, dt)
+    _encoders.append(encoder)
+    return encoder
+
+
+# 编码器加速曲线: (两步间隔 ms, 步长倍数)，连续同向转动的间隔小于某一项时步长乘以该项的倍数
+# 约 20 格/秒以上开始加速，慢慢转动时每格仍只改变一个步长
+ROTARY_ACCEL = ((50, 2), (30, 4), (15, 8))
+
+
+# 编码器租约: 保存数值、最小值、最大值、步长、范围模式和加速曲线，setEnable(True) 时成为编码器的当前租约
+# 同一时间只有一个租约生效，开启另一个租约时本租约的数值被保存，关闭不是当前租约的 Rotary 不影响编码器
+# 生效时每轮的步数为 steps，各事件的步数和时间戳为 deltas[:count] / times[:count]
+# MODE_BOUNDED 下停在最小值或最大值的转动不产生事件
 class Rotary:
     MODE_UNBOUNDED = RotaryIRQ.RANGE_UNBOUNDED
     MODE_BOUNDED = RotaryIRQ.RANGE_BOUNDED
@@ -326,60 +1859,90 @@ class Rotary:
         self.clk = clk
         self.min = min
         self.mode = mode
-        self.rotary = RotaryIRQ(pin_num_clk=self.clk,
-                                pin_num_dt=self.dt,
-                                min_val=self.min,
-                                reverse=False,
-                                half_step=True,
-                                range_mode=self.mode)
-        self.setEnable(False)
+        self.encoder = getEncoder(clk, dt)
+        self.deltas = self.encoder.deltas
+        self.times = self.encoder.times
+        self.steps = 0
+        self.count = 0
+        self.listeners = []
+        self.init()
         self.callback = None
 
+    # 恢复创建时的数值和范围设置
     def init(self):
-        self.rotary = RotaryIRQ(pin_num_clk=self.clk,
-                                pin_num_dt=self.dt,
-                                min_val=self.min,
-                                reverse=False,
-                                half_step=True,
-                                range_mode=self.mode)
+        self._value = self.min
+        self._min = self.min
+        self._max = 10
+        self._incr = 1
+        self._mode = self.mode
+        self._accel = None
+        self._apply()
+
+    def active(self):
+        return self.encoder.lease is self
+
+    def _apply(self):
+        if self.encoder.lease is self:
+            self.encoder.rotary.load(self.value(), self._min, self._max, self._incr, self._mode, self._accel)
 
     def setEnable(self, flag: bool):
         if flag:
-            self.rotary.enable()
+            self.encoder.acquire(self)
         else:
-            self.rotary.close()
+            self.encoder.release(self)
 
     def setIncr(self, count: int):
-        self.rotary.setIncr(count)
+        self._incr = abs(count)
+        self._apply()
+
+    # 设置加速曲线，如 ROTARY_ACCEL，None 关闭加速
+    # 曲线在这里转换为中断中使用的数组 (间隔 us, 倍数, ...)，中断中不分配内存
+    def setAccel(self, curve):
+        if curve is None:
+            self._accel = None
+        else:
+            accel = array('L')
+            for ms, multiplier in sorted(curve, reverse=True):
+                accel.append(ms * 1000)
+                accel.append(multiplier)
+            self._accel = accel
+        self._apply()
 
     def setListener(self, fun):
-        self.rotary.add_listener(fun)
+        self.listeners.append(fun)
 
     def delListener(self, fun):
-        self.rotary.remove_listener(fun)
+        self.listeners.remove(fun)
 
     def setValue(self, value: int):
-        self.rotary.setValue(value)
+        self._value = value
+        if self.encoder.lease is self:
+            self.encoder.rotary.setValue(value)
 
     def setValueMax(self, value: int):
-        self.rotary.setValueMax(value)
+        self._max = value
+        self._apply()
 
     def setValueMin(self, value: int):
-        self.rotary.setValueMin(value)
+        self._min = value
+        self._apply()
 
     def setRangeMode(self, mode):
         if mode == 'MODE_UNBOUNDED':
-            self.rotary.setRangeMode(self.MODE_UNBOUNDED)
+            self._mode = self.MODE_UNBOUNDED
         elif mode == 'MODE_BOUNDED':
-            self.rotary.setRangeMode(self.MODE_BOUNDED)
+            self._mode = self.MODE_BOUNDED
         elif mode == 'MODE_WRAP':
-            self.rotary.setRangeMode(self.MODE_WRAP)
+            self._mode = self.MODE_WRAP
         else:
             print('mode error')
             raise Exception
+        self._apply()
 
     def value(self):
-        return self.rotary.value()
+        if self.encoder.lease is self:
+            return self.encoder.rotary.value()
+        return self._value
 
 
 class ViewPager(Window):
@@ -402,9 +1965,30 @@ class ViewPager(Window):
         self._back_scroll_flag = None
         self._last_time = time.ticks_ms()
         self.refresh_interval = refresh_interval
+        # 翻页动画时长 (ms)，由 scrollSpeed 换算，scrollSpeed 越大越快
+        self.duration = int(20 / scrollSpeed)
+        self._tween = Tween()
+        # 滚动时显示的左、中、右三页，widgetsChecked 或子控件变化时才重新填写
+        self._pages = [None, None, None]
+        self._pagesFor = -1
 
         self.switch_siganl.connect(self.switch_widget)
 
+    def treeChanged(self):
+        super().treeChanged()
+        self._pagesFor = -1
+
+    def _neighbours(self):
+        checked = self.widgetsChecked
+        if self._pagesFor != checked:
+            widgets = self.widgets
+            pages = self._pages
+            pages[0] = widgets[(checked - 1) % len(widgets)]
+            pages[1] = widgets[checked]
+            pages[2] = widgets[(checked + 1) % len(widgets)]
+            self._pagesFor = checked
+        return self._pages
+
     def switch_widget(self):
         self.buttonPassthrough = False
 
@@ -445,23 +2029,39 @@ class ViewPager(Window):
 
     def gui_update(self):
         now_time = time.ticks_ms()
-        if time.ticks_diff(now_time, self._last_time) > self.refresh_interval:
+        elapsed = time.ticks_diff(now_time, self._last_time)
+        if elapsed > self.refresh_interval:
+            scrollCount = self.scrollCount
+            widgetsChecked = self.widgetsChecked
             self.update()
+            if scrollCount != self.scrollCount or widgetsChecked != self.widgetsChecked:
+                self.invalidate()
             self._last_time = now_time
-        widgets = self.widgets
+            elapsed = 0
+        if self._pending():
+            self.requestUpdate(self.refresh_interval - elapsed + 1)
+        if self._tween.active or self._back_scroll_count != 0:
+            self.reportMotion()
         if self.scroll_flag != None:
-            widgets = [widgets[(self.widgetsChecked - 1) % len(widgets)],
-                       widgets[self.widgetsChecked],
-                       widgets[(self.widgetsChecked + 1) % len(widgets)]]
-            for widget in widgets:
-                widget.gui_update()
+            # 与 gui_show 相同地排列三页，完全滑出可见区域的页面跳过
+            x = self.scrollCount - self.w
+            for widget in self._neighbours():
+                if not widget.hidden:
+                    if x + self.w <= 0 or x >= self.w:
+                        _cull()
+                    else:
+                        widget.gui_update()
+                    x += self.w
         else:
-            widget = widgets[self.widgetsChecked]
-            widget.gui_update()
+            self.widgets[self.widgetsChecked].gui_update()
 
     def update(self):
         self._scroll()
 
+    # 是否还有未完成的滚动，需要继续按 refresh_interval 更新
+    def _pending(self):
+        return self.scroll_flag != None or self._back_scroll_count != 0
+
     def _scroll(self):
         pass
 
@@ -469,23 +2069,24 @@ class ViewPager(Window):
         pass
 
     def gui_show(self):
+        if self.dirtyRect.isEmpty():
+            return self.render
+        self.dirtyRect.clear()
         self.buffer.fill(0)
-        widgets = self.widgets
-        count = -self.w
         if self.scroll_flag != None:
-            widgets = [widgets[(self.widgetsChecked - 1) % len(widgets)],
-                       widgets[self.widgetsChecked],
-                       widgets[(self.widgetsChecked + 1) % len(widgets)]]
-            for widget in widgets:
+            x = self.scrollCount - self.w
+            for widget in self._neighbours():
                 if not widget.hidden:
-                    res = widget.gui_show()
-                    self.buffer.blit(res[0], ceil(count + self.scrollCount), 0, res[3])
-                    count += self.w
+                    if x + self.w <= 0 or x >= self.w:
+                        _cull()
+                    else:
+                        render = widget.gui_show()
+                        self.buffer.blit(render[0], x, 0, render[3])
+                    x += self.w
         else:
-            widget = widgets[self.widgetsChecked]
-            res = widget.gui_show()
-            self.buffer.blit(res[0], 0, 0, res[3])
-        return (self.buffer, self.x, self.y, self.brackGround)
+            render = self.widgets[self.widgetsChecked].gui_show()
+            self.buffer.blit(render[0], 0, 0, render[3])
+        return self.render
 
 
 class Lable(Widget):
@@ -497,39 +2098,76 @@ class Lable(Widget):
         self.refresh_interval = refresh_interval
         self.last_time = time.ticks_ms()
         self.pbm = None
+        # setPbmHandle() 显示的图片只保存句柄
+        self._pbmManager = None
+        self._handle = None
         self.scrollSpeed = scrollSpeed
+        # 每移动一个像素的时间 (ms)，scrollSpeed 为每 refresh_interval 移动的像素数
+        self.pixel_time = int(refresh_interval / scrollSpeed)
+        self._tween = Tween()
 
+    # 跑马灯每 pixel_time 才移动一个像素，只在下一次移动时更新，不占用动画的刷新率
     def gui_update(self):
-        now_time = time.ticks_ms()
-        if time.ticks_diff(now_time, self.last_time) >= self.refresh_interval:
-            if self.scroll_flag:
-                if self.scroll_count > 0:
-                    self.scroll_count -= self.scrollSpeed
-                else:
-                    self.scroll_count = self.pbm.w
-            self.last_time = now_time
+        if self.scroll_flag:
+            now_time = time.ticks_ms()
+            offset = self.scroll_count
+            self.scroll_count = self._tween.value(now_time)
+            if self.scroll_count != offset:
+                self.invalidate()
+            # 线性动画在半像素处四舍五入到下一个位置
+            phase = (self._tween.elapsed(now_time) + self.pixel_time // 2) % self.pixel_time
+            self.requestUpdate(self.pixel_time - phase + 1)
+
+    # 显示文字，font 为 None 时使用默认的 5x7 字体
+    def setText(self, text, font=None):
+        if font is None:
+            font = getFont()
+        self.setPbm(font.render(text))
 
     def setPbm(self, pbm: Pbm):
         self.pbm = pbm
-        if self.pbm.w > self.w:
+        self._pbmManager = None
+        self._handle = None
+        self._layout(pbm)
+
+    # 显示 PbmManager 中的图片，不保存 Pbm，管理器释放图片后内存可以回收
+    # 不滚动时只在这里贴图一次，滚动时每帧重新 get()，被释放后再次用到时重新读取
+    def setPbmHandle(self, pbmManager, handle):
+        self.pbm = None
+        self._pbmManager = pbmManager
+        self._handle = handle
+        self._layout(pbmManager.get(handle))
+
+    def _image(self) -> Pbm:
+        if self._handle is None:
+            return self.pbm
+        return self._pbmManager.get(self._handle)
+
+    def _layout(self, pbm):
+        if pbm.w > self.w:
             self.scroll_flag = True
-            self.scroll_count = self.pbm.w
+            self.scroll_count = pbm.w
+            self._tween.start(pbm.w, 0, pbm.w * self.pixel_time, EASE_LINEAR, True)
         else:
+            self._tween.stop()
             self.buffer.fill(0)
             self.scroll_flag = False
             self.scroll_count = 0
-            self.buffer.blit(self.pbm.pbmPrint(), round((self.w - self.pbm.w) / 2), 0, self.brackGround)
+            self.buffer.blit(pbm.pbmPrint(), round((self.w - pbm.w) / 2), 0, self.brackGround)
+        self.invalidate()
 
     def gui_show(self) -> (framebuf, int, int, int):
-        if self.scroll_flag:
+        if self.scroll_flag and self.dirty:
+            self.dirty = False
             self.buffer.fill(0)
+            pbm = self._image()
             if self.scroll_count != 0:
-                self.buffer.blit(self.pbm.pbmPrint(), round(-self.pbm.w + self.scroll_count), 0, self.brackGround)
-                self.buffer.blit(self.pbm.pbmPrint(), round(self.scroll_count), 0, self.brackGround)
+                self.buffer.blit(pbm.pbmPrint(), self.scroll_count - pbm.w, 0, self.brackGround)
+                self.buffer.blit(pbm.pbmPrint(), self.scroll_count, 0, self.brackGround)
             else:
-                self.buffer.blit(self.pbm.pbmPrint(), 0, 0, self.brackGround)
+                self.buffer.blit(pbm.pbmPrint(), 0, 0, self.brackGround)
 
-        return (self.buffer, self.x, self.y, self.brackGround)
+        return self.render
 
 
 class Animation(Widget):
@@ -542,37 +2180,50 @@ class Animation(Widget):
         self._last_time = time.ticks_ms()
         self._pbmListRange = [0, 0]
         self._pbmCount = 0
+        # 各帧图片的句柄，dir 改变后重新获取
+        self._frames = []
+        self._framesDir = None
 
     def setPbmManager(self, pbmManager):
         self._pbmManager = pbmManager
+        self._framesDir = None
 
     def setRange(self, msg: list):
         self._pbmListRange = msg
+        self._framesDir = None
+
+    def _loadFrames(self, path):
+        self._frames = [self._pbmManager.handle('%s/%d.pbm' % (path, i)) for i in range(0, self._pbmListRange[1] + 1)]
+
+    def _frame(self, count):
+        if self._framesDir is not self.dir:
+            self._framesDir = self.dir
+            self._loadFrames(self.dir)
+        return self._pbmManager.get(self._frames[count]).pbmPrint()
 
     def gui_update(self):
         now_time = time.ticks_ms()
-        if time.ticks_diff(now_time, self._last_time) > self._duration:
+        elapsed = time.ticks_diff(now_time, self._last_time)
+        if elapsed > self._duration:
             self.buffer.fill(0)
             self._last_time = now_time
+            elapsed = 0
             if self._pbmCount == self._pbmListRange[1]:
                 self._pbmCount = 0
             else:
                 self._pbmCount += 1
-            self.buffer.blit(self._pbmManager.get_Pbm('%s/%s.pbm' % (self.dir, str(self._pbmCount))).pbmPrint(),
-                             0,
-                             0,
-                             self.brackGround)
-        else:
-            pass
+            self.buffer.blit(self._frame(self._pbmCount), 0, 0, self.brackGround)
+            self.invalidate()
+        self.requestUpdate(self._duration - elapsed + 1)
 
     def gui_show(self) -> (framebuf, int, int, int):
-        return (self.buffer, self.x, self.y, self.brackGround)
+        return self.render
 
 
 class ScreenButton(Animation):
 
     def __init__(self, parant, widget_info, duration=30, insert=None, loc="Top", brackGround=-1):
-        super().__init__(parant, widget_info, insert, loc, brackGround)
+        super().__init__(parant, widget_info, duration, insert, loc, brackGround)
         self._pbmManager = None
         self._duration = duration
         self.dir = ''
@@ -582,12 +2233,26 @@ class ScreenButton(Animation):
         self._pbmCount = 0
         self.state = False
         self.play_flag = False
+        self._idle_drawn = False
+        self._frames = []
+        self._framesDir = None
+        self._framesState = None
 
     def setPbmManager(self, pbmManager):
         self._pbmManager = pbmManager
+        self._framesDir = None
 
     def setRange(self, msg: list):
         self._pbmListRange = msg
+        self._framesDir = None
+
+    # 开关两种状态的帧分别在 dir + state_dir 目录下
+    def _frame(self, count):
+        if self._framesDir is not self.dir or self._framesState is not self.state_dir:
+            self._framesDir = self.dir
+            self._framesState = self.state_dir
+            self._loadFrames(self.dir + self.state_dir)
+        return self._pbmManager.get(self._frames[count]).pbmPrint()
 
     def setState(self, flag: bool):
         if flag != self.state:
@@ -605,30 +2270,28 @@ class ScreenButton(Animation):
     def gui_update(self):
         if self.play_flag:
             now_time = time.ticks_ms()
-            if time.ticks_diff(now_time, self._last_time) > self._duration:
+            elapsed = time.ticks_diff(now_time, self._last_time)
+            if elapsed > self._duration:
                 self.buffer.fill(0)
                 self._last_time = now_time
+                elapsed = 0
                 if self._pbmCount == self._pbmListRange[1]:
                     self.play_flag = False
                 else:
                     self._pbmCount += 1
-                self.buffer.blit(self._pbmManager.get_Pbm(
-                    '%s%s/%s.pbm' % (self.dir, self.state_dir, str(self._pbmCount))).pbmPrint(),
-                                 0,
-                                 0,
-                                 self.brackGround)
-            else:
-                pass
-        else:
-            self.buffer.blit(
-                self._pbmManager.get_Pbm(
-                    '%s%s/%s.pbm' % (self.dir, self.state_dir, str(self._pbmListRange[1]))).pbmPrint(),
-                0,
-                0,
-                self.brackGround)
+                self.buffer.blit(self._frame(self._pbmCount), 0, 0, self.brackGround)
+                self._idle_drawn = True
+                self.invalidate()
+            if self.play_flag:
+                self.reportMotion()
+                self.requestUpdate(self._duration - elapsed + 1)
+        elif not self._idle_drawn:
+            self.buffer.blit(self._frame(self._pbmListRange[1]), 0, 0, self.brackGround)
+            self._idle_drawn = True
+            self.invalidate()
 
     def gui_show(self) -> (framebuf, int, int, int):
-        return (self.buffer, self.x, self.y, self.brackGround)
+        return self.render
 
 
 class Number(Widget):
@@ -652,6 +2315,23 @@ class Number(Widget):
         self.list = []
         self.scrollSpeed = scrollSpeed
         self.scroll_list_flag = False
+        # 滚动一个数字的时间 (ms)，scrollSpeed 为每 refresh_interval 移动的像素数
+        self.duration = int((self.h + 1) * refresh_interval / scrollSpeed)
+        self._tween = Tween()
+        # 数字 0 - 9 图片的句柄，第一次绘制时获取
+        self._digits = None
+
+    def _digit(self, value):
+        if self._digits is None:
+            self._digits = [self.pbmManager.handle('%d.pbm' % i) for i in range(0, 10)]
+        return self._digits[value]
+
+    def _glyph(self, value):
+        return self.pbmManager.get(self._digit(value)).pbmPrint()
+
+    # 上下两个数字拼接的滚动图
+    def _strip(self, top, bottom):
+        return self.pbmManager.strip(self._digit(top), self._digit(bottom))
 
     def setUpperLimitNumber(self, value: int):
         self.upper_limit_number = value
@@ -699,63 +2379,62 @@ class Number(Widget):
             self.scroll_count = self.h + 1
         else:
             self.scroll_count = self.w + 1
+        # 有排队的数字时加快滚动，最快一次刷新滚完
+        duration = self.duration
+        if len(self.list) > 0:
+            duration //= len(self.list) * 2
+            if duration < self.refresh_interval:
+                duration = self.refresh_interval
+        self._tween.start(self.scroll_count, 0, duration, EASE_LINEAR)
         self.value_old = self.value
         self.value = value
+        self.invalidate()
 
     def getValue(self) -> int:
         return self.value
 
     def gui_update(self):
-        now_time = time.ticks_ms()
-        if time.ticks_diff(now_time, self.last_time) > self.refresh_interval:
-            if self.scroll_flag:
-                if self.scroll_count > 0:
-                    if len(self.list) > 0:
-                        scrollSpeed = self.scrollSpeed * len(self.list) * 2
-                        if scrollSpeed > self.h:
-                            scrollSpeed = self.h
-                    else:
-                        scrollSpeed = self.scrollSpeed
-                    self.scroll_count -= scrollSpeed
-                    if self.scroll_count - 0 < scrollSpeed:
-                        self.scroll_count = 0
-                else:
-                    self.scroll_flag = False
-                    if self.scroll_list_flag:
-                        if len(self.list) == 0:
-                            self.scroll_list_flag = False
-            else:
-                if len(self.list) > 0:
-                    self._scroll(self.list.pop(0))
-            self.last_time = now_time
+        if self.scroll_flag:
+            now_time = time.ticks_ms()
+            offset = self.scroll_count
+            self.scroll_count = self._tween.value(now_time)
+            if self.scroll_count != offset:
+                self.invalidate()
+            if self._tween.done(now_time):
+                self._tween.stop()
+                self.scroll_flag = False
+                self.invalidate()
+                if self.scroll_list_flag:
+                    if len(self.list) == 0:
+                        self.scroll_list_flag = False
+        elif len(self.list) > 0:
+            self._scroll(self.list.pop(0))
+        if self.scroll_flag or len(self.list) > 0:
+            self.reportMotion()
+            self.requestUpdate(self.refresh_interval)
 
     def gui_show(self) -> (framebuf, int, int, int):
+        if not self.dirty:
+            return self.render
+        self.dirty = False
         self.buffer.fill(0)
         if self.scroll_flag:
             if self.switchDirection == 0:  # down
-                self.buffer.blit(self.pbmManager.get_Pbm('%s.pbm' % self.value).pbmPrint(),
-                                 0,
-                                 round(0 - self.scroll_count),
-                                 self.brackGround)
-                self.buffer.blit(self.pbmManager.get_Pbm('%s.pbm' % self.value_old).pbmPrint(),
+                self.buffer.blit(self._strip(self.value, self.value_old),
                                  0,
-                                 round(0 - self.scroll_count + self.h + 1),
+                                 0 - self.scroll_count,
                                  self.brackGround)
             elif self.switchDirection == 1:  # up
-                self.buffer.blit(self.pbmManager.get_Pbm('%s.pbm' % self.value).pbmPrint(),
-                                 0,
-                                 round(self.scroll_count),
-                                 self.brackGround)
-                self.buffer.blit(self.pbmManager.get_Pbm('%s.pbm' % self.value_old).pbmPrint(),
+                self.buffer.blit(self._strip(self.value_old, self.value),
                                  0,
-                                 round(-self.h + self.scroll_count - 1),
+                                 self.scroll_count - self.h - 1,
                                  self.brackGround)
         else:
-            self.buffer.blit(self.pbmManager.get_Pbm('%s.pbm' % self.value).pbmPrint(),
+            self.buffer.blit(self._glyph(self.value),
                              0,
                              0,
                              self.brackGround)
-        return (self.buffer, self.x, self.y, self.brackGround)
+        return self.render
 
 
 class NumberGroup(Window):
@@ -794,10 +2473,11 @@ class NumberGroup(Window):
     def _update_show_X(self):
         x = self.show_X
         for num in self.numberList:
-            num.x = x
+            num.setPos(x, num.y)
             x += 5
         for i in self.numberList:
             print(self.parant, i, i.x)
+        self.invalidate()
 
     def setValue(self, value: str):
         if self.value != value:
@@ -827,6 +2507,8 @@ class RotaryViewPager(ViewPager):
         super().__init__(parant, window_info, scrollSpeed, back, back_count, insert, loc, brackGround, refresh_interval)
         self.rotary = Rotary(rotary_pin[0], rotary_pin[1])
         print(self, self.rotary)
+        # 页面停稳以来转过的格数，每轮累加编码器取出的步数
+        self.turned = 0
         self.rotary_value_old = 0
         self.rotary_value_count = 0
         self.pbmManager = PbmManager()
@@ -835,6 +2517,14 @@ class RotaryViewPager(ViewPager):
         self.buttonPassthrough = False
         self.rotary.setEnable(True)
 
+    def _pending(self):
+        return super()._pending() or self.turned != 0
+
+    def gui_update(self):
+        # update() 按 refresh_interval 执行，每轮的步数都先累加，不会漏掉
+        self.turned += self.rotary.steps
+        super().gui_update()
+
     def buttonCallback(self, pin, msg):
         if msg == 0:
             print('viewpager button', self.widgetsChecked, self.widgets)
@@ -852,7 +2542,7 @@ class RotaryViewPager(ViewPager):
                 print('window: %s is not Checkable' % self.widgets[self.widgetsChecked])
 
     def update(self):
-        rotary_value = self.rotary.value()
+        rotary_value = self.turned
         rotary_value_old = self.rotary_value_old
         if self._back_scroll_count == 0:
             if self.scroll_flag == None and rotary_value != 0:
@@ -884,63 +2574,39 @@ class RotaryViewPager(ViewPager):
             self._scroll()
 
     def _scroll(self):
-        if self.scroll_flag == 'right':
+        flag = self.scroll_flag
+        if flag == 'right' or flag == 'left':
             self.checkable = False
-            if self.scrollCount < self.w:
-                count = (self.w - self.scrollCount) * self.scrollSpeed
-                if count < 0.7:
-                    count = 0.7
-                if self.scrollCount + count >= self.w:
-                    self.scrollCount = self.w
-                else:
-                    self.scrollCount += count
-            else:
+            tween = self._tween
+            if not tween.active:
+                tween.start(self.scrollCount, self.w if flag == 'right' else -self.w, self.duration, EASE_OUT)
+            now_time = time.ticks_ms()
+            self.scrollCount = tween.value(now_time)
+            if tween.done(now_time):
+                tween.stop()
                 self.scrollCount = 0
                 self.rotary_value_count = 0
                 self.scroll_flag = None
-                self.widgetsChecked = (self.widgetsChecked - 1) % len(self.widgets)
-                if self._back_scroll_count > 0:
-                    self._back_scroll_count -= 1
+                if flag == 'right':
+                    self.widgetsChecked = (self.widgetsChecked - 1) % len(self.widgets)
                 else:
-                    self.checkable = True
-                    self.rotary.setValue(0)
-        elif self.scroll_flag == 'left':
-            self.checkable = False
-            if self.scrollCount > -self.w:
-                count = abs(self.w + self.scrollCount) * self.scrollSpeed
-                if count < 0.7:
-                    count = 0.7
-                if self.scrollCount - count <= -self.w:
-                    self.scrollCount = -self.w
-                else:
-                    self.scrollCount -= count
-            else:
-                self.scrollCount = 0
-                self.rotary_value_count = 0
-                self.scroll_flag = None
-                self.widgetsChecked = (self.widgetsChecked + 1) % len(self.widgets)
+                    self.widgetsChecked = (self.widgetsChecked + 1) % len(self.widgets)
                 if self._back_scroll_count > 0:
                     self._back_scroll_count -= 1
                 else:
                     self.checkable = True
-                    self.rotary.setValue(0)
-        elif self.scroll_flag == 'back_right':
-            self.checkable = False
-            if self.scrollCount < 0:
-                self.scrollCount += ceil((-self.scrollCount + 1) * self.scrollSpeed)
-            else:
-                self.scrollCount = 0
-                self.rotary_value_count = 0
-                self.scroll_flag = None
-                self.checkable = True
-                self.rotary.setValue(0)
-        elif self.scroll_flag == 'back_left':
+                    self.turned = 0
+        elif flag == 'back_right' or flag == 'back_left':
             self.checkable = False
-            if self.scrollCount > 0:
-                self.scrollCount -= ceil(self.scrollCount * self.scrollSpeed)
-            else:
+            tween = self._tween
+            if not tween.active:
+                tween.start(self.scrollCount, 0, self.duration, EASE_SPRING)
+            now_time = time.ticks_ms()
+            self.scrollCount = tween.value(now_time)
+            if tween.done(now_time):
+                tween.stop()
                 self.scrollCount = 0
                 self.rotary_value_count = 0
                 self.scroll_flag = None
                 self.checkable = True
-                self.rotary.setValue(0)
\ No newline at end of file
+                self.turned = 0
\ No newline at end of file
@@ -0,0 +1,222 @@
+'''
+pymg 性能测试，在设备 REPL 中中断 main.py 后运行:
+
+import pymg_bench
+pymg_bench.bench_wakeups(mainWindow)
+pymg_bench.bench_boot()
+pymg_bench.bench_digit_roll()
+pymg_bench.bench_blit()
+pymg_bench.bench_zoom()
+pymg_bench.test_frame_alloc(mainWindow)
+pymg_bench.bench_rotary()
+'''
+
+import time, gc, framebuf, micropython
+from array import array
+import pymg, rotary
+
+
+# 对比忙等循环与截止时间调度下每秒的唤醒次数和 CPU 占用
+def bench_wakeups(gui, ms=10000):
+    for spin in (True, False):
+        gui.wakeups = 0
+        busy = 0
+        start = time.ticks_ms()
+        while time.ticks_diff(time.ticks_ms(), start) < ms:
+            t = time.ticks_us()
+            sleep = gui.step()
+            busy += time.ticks_diff(time.ticks_us(), t)
+            if not spin:
+                gui.idle(sleep)
+        print('%-8s wakeups/s: %d  cpu: %d%%' % ('spin' if spin else 'deadline', gui.wakeups * 1000 // ms,
+                                                 busy // (ms * 10)))
+
+
+# 对比逐个读取 .pbm 文件与从资源包读取全部图片的耗时，资源包由 host/pack.py 生成
+def bench_boot(bundle='assets.bin'):
+    old = pymg._bundle
+    pymg._bundle = None
+    try:
+        index = pymg.PbmBundle(bundle)
+        names = index.names()
+        index.close()
+        gc.collect()
+        start = time.ticks_us()
+        for name in names:
+            pymg.Pbm(name)
+        files = time.ticks_diff(time.ticks_us(), start)
+        gc.collect()
+        start = time.ticks_us()
+        pymg.loadBundle(bundle)
+        for name in names:
+            pymg.Pbm(name)
+        packed = time.ticks_diff(time.ticks_us(), start)
+        pymg._bundle.close()
+    finally:
+        pymg._bundle = old
+    print('%d images  files: %dus  bundle: %dus' % (len(names), files, packed))
+
+
+# 数字滚动每帧的贴图耗时: 两张数字图分别贴图 与 预先拼接的滚动图一次贴图
+def bench_digit_roll(frames=1000):
+    manager = pymg.PbmManager()
+    digits = [manager.add('%d.pbm' % i) for i in range(0, 10)]
+    fmt = pymg.getFormat()
+    buffer = framebuf.FrameBuffer(bytearray(pymg.buffer_size(5, 7, fmt)), 5, 7, fmt)
+    for i in range(0, 10):
+        manager.strip(digits[i], digits[(i + 1) % 10])
+    start = time.ticks_us()
+    for n in range(0, frames):
+        value = n % 10
+        offset = n % 8
+        buffer.fill(0)
+        buffer.blit(manager.get(digits[(value + 1) % 10]).pbmPrint(), 0, -offset, -1)
+        buffer.blit(manager.get(digits[value]).pbmPrint(), 0, -offset + 8, -1)
+    glyphs = time.ticks_diff(time.ticks_us(), start)
+    start = time.ticks_us()
+    for n in range(0, frames):
+        value = n % 10
+        offset = n % 8
+        buffer.fill(0)
+        buffer.blit(manager.strip(digits[(value + 1) % 10], digits[value]), 0, -offset, -1)
+    strips = time.ticks_diff(time.ticks_us(), start)
+    print('digit roll per frame  two glyphs: %dus  strip: %dus' % (glyphs // frames, strips // frames))
+
+
+# 合成 40x7 整屏时一次 blit 的耗时: 源缓冲区与屏幕帧同为 MONO_VLSB，或需要转换位序的 MONO_HLSB / MONO_HMSB
+def bench_blit(frames=1000):
+    frame = framebuf.FrameBuffer(bytearray(pymg.buffer_size(40, 7, framebuf.MONO_VLSB)), 40, 7, framebuf.MONO_VLSB)
+    result = []
+    for name, fmt in (('VLSB', framebuf.MONO_VLSB), ('HLSB', framebuf.MONO_HLSB), ('HMSB', framebuf.MONO_HMSB)):
+        source = framebuf.FrameBuffer(bytearray(pymg.buffer_size(40, 7, fmt)), 40, 7, fmt)
+        source.fill_rect(0, 0, 20, 7, 1)
+        start = time.ticks_us()
+        for n in range(0, frames):
+            frame.blit(source, 0, 0, -1)
+        result.append('%s: %dus' % (name, time.ticks_diff(time.ticks_us(), start) // frames))
+    print('40x7 blit to VLSB per frame  ' + '  '.join(result))
+
+
+# 逐像素调用 pixel() 的缩放，作为对比
+def _zoom_pixel(pbm, w, h):
+    image = pbm.pbmPrint()
+    fmt = pbm.format
+    fb = framebuf.FrameBuffer(bytearray(pymg.buffer_size(w, h, fmt)), w, h, fmt)
+    for x in range(0, w):
+        for y in range(0, h):
+            fb.pixel(x, y, image.pixel((2 * x + 1) * pbm.w // (2 * w), (2 * y + 1) * pbm.h // (2 * h)))
+    return fb
+
+
+# 把数字图片放大到 w x h: 逐像素缩放、整数表缩放、PbmManager 缓存命中
+def bench_zoom(w=20, h=28, count=10):
+    manager = pymg.PbmManager()
+    digit = manager.add('8.pbm')
+    pbm = manager.get(digit)
+    start = time.ticks_us()
+    for n in range(0, count):
+        _zoom_pixel(pbm, w, h)
+    pixel = time.ticks_diff(time.ticks_us(), start)
+    start = time.ticks_us()
+    for n in range(0, count):
+        pbm.zoom(w, h)
+    table = time.ticks_diff(time.ticks_us(), start)
+    manager.zoom(digit, w, h)
+    start = time.ticks_us()
+    for n in range(0, count):
+        manager.zoom(digit, w, h)
+    cached = time.ticks_diff(time.ticks_us(), start)
+    print('zoom 5x7 -> %dx%d  pixel: %dus  table: %dus  cached: %dus' % (
+        w, h, pixel // count, table // count, cached // count))
+
+
+def _widgets(widgets, out):
+    for widget in widgets:
+        out.append(widget)
+        if hasattr(widget, 'widgets'):
+            _widgets(widget.widgets, out)
+    return out
+
+
+def _frame_alloc(gui, widgets, frames, name):
+    gui.step()
+    gc.collect()
+    for n in range(0, frames):
+        for widget in widgets:
+            widget.invalidate()
+        gui.last_show_time = time.ticks_add(time.ticks_ms(), -gui.refresh_interval)
+        before = gc.mem_alloc()
+        gui.step()
+        used = gc.mem_alloc() - before
+        assert used == 0, '%s: frame %d allocated %dB' % (name, n, used)
+    print('%s  %d frames  0B allocated per frame' % (name, frames))
+
+
+# 稳态帧不分配内存: 每帧把所有控件标记为需要重绘后执行一轮 step()，断言 gc.mem_alloc() 没有增长
+# 应在内容不变化的页面 (如亮度页面) 运行，时间变化、按键、网络等事件本身会分配内存
+# 之后切换到亮度页面并进入设置状态 (反色显示亮度条) 再测一次，结束后恢复原来的页面
+def test_frame_alloc(gui, frames=100):
+    widgets = _widgets(gui.windows, [])
+    _frame_alloc(gui, widgets, frames, 'current page')
+    # 亮度页面: 有 inver_flag 的控件，父控件为翻页控件
+    for page in widgets:
+        if hasattr(page, 'inver_flag'):
+            break
+    else:
+        print('brightness page not found')
+        return
+    pager = page.parant
+    checked = pager.widgetsChecked
+    pager.widgetsChecked = pager.widgets.index(page)
+    pager.buttonPassthrough = True
+    pager.rotary.setEnable(False)
+    page.focus(0)
+    try:
+        _frame_alloc(gui, widgets, frames, 'brightness focused')
+    finally:
+        page.rotary.setEnable(False)
+        page.dimLable.hidden = False
+        page.inver_flag = False
+        pager.buttonPassthrough = False
+        pager.widgetsChecked = checked
+        pager.rotary.setEnable(True)
+        pager.invalidate()
+
+
+# 从预先准备的电平序列读取 CLK / DT 的编码器，不使用引脚
+class _ReplayRotary(rotary.Rotary):
+
+    def __init__(self, edges):
+        super().__init__(0, 23, 1, False, rotary.Rotary.RANGE_WRAP, True, False)
+        self.edges = edges
+        self.i = 0
+
+    def _hal_get_clk_value(self):
+        return self.edges[self.i] >> 1
+
+    def _hal_get_dt_value(self):
+        return self.edges[self.i] & 1
+
+
+# 编码器中断处理函数每个边沿的耗时: 在 micropython.heap_lock() 下直接调用处理函数回放 turns 圈顺时针再 turns 圈逆时针
+# 处理函数分配内存时抛出 MemoryError，回放后数值应回到起点
+def bench_rotary(turns=500):
+    # 半步解码，CLK / DT 电平 (CLK << 1 | DT) 从 11 开始，每 4 个边沿转 2 格
+    edges = bytes((1, 0, 2, 3)) * turns + bytes((2, 0, 1, 3)) * turns
+    encoder = _ReplayRotary(edges)
+    encoder.setAccel(array('L', [50000, 2, 15000, 8]))
+    handler = encoder._process_rotary_pins
+    count = len(edges)
+    gc.collect()
+    micropython.heap_lock()
+    try:
+        start = time.ticks_us()
+        for i in range(0, count):
+            encoder.i = i
+            handler(None)
+        us = time.ticks_diff(time.ticks_us(), start)
+    finally:
+        micropython.heap_unlock()
+    assert encoder.value() == 0, 'decoded value %d, expected 0' % encoder.value()
+    print('rotary irq  %d edges  %dus per edge  no allocation under heap_lock' % (count, us // count))
+
@@ -8,9 +8,11 @@ class RotaryPager(RotaryViewPager):
 
     def __init__(self, parant, window_info, scrollSpeed=0.1, back=2, back_count=100, insert=None, loc="Top"):
         super().__init__(parant, window_info, scrollSpeed, back, back_count, insert, loc)
+        # 数字和冒号常驻，其他页面的图片按需读取
+        self.pbmManager.setBudget(512)
         for i in range(0, 10):
-            self.pbmManager.add_pbm(Pbm('%s.pbm' % i))
-        self.pbmManager.add_pbm(Pbm('colon.pbm'))
+            self.pbmManager.add('%s.pbm' % i, pin=True)
+        self.pbmManager.add('colon.pbm', pin=True)
 
         self.window_1 = TimeWindow(self, (0, 0, 40, 7))
         self.window_3 = SetBrightness(self, (0, 0, 40, 7))
@@ -44,10 +46,13 @@ class TimeWindow(Window):
         self._scrollSpeed = scrollSpeed
         self.flicker_interval = flicker_interval
         self.rtc = RTC()
+        self._subsecond = 0
         self._time = self._get_time()
         self._last_time = time.ticks_ms()
         self._numberList = []
         self._secCount = 0
+        self._colon_on = True
+        self._field_blank = False
         self._setMode = False
         self.isCheckable = True
         self._setCount = 0
@@ -60,6 +65,7 @@ class TimeWindow(Window):
 
     def setPbmManager(self, pbmManager):
         self.pbmManager = pbmManager
+        self._colon = pbmManager.handle('colon.pbm')
         self._numberList = [NumberGroup(self, (0, 0, 10, 7), self._scrollSpeed, first_digit_upper_limit=2),
                             NumberGroup(self, (15, 0, 10, 7), self._scrollSpeed, first_digit_upper_limit=5),
                             NumberGroup(self, (30, 0, 10, 7), self._scrollSpeed, first_digit_upper_limit=5)]
@@ -68,7 +74,9 @@ class TimeWindow(Window):
             self._numberList[i].setDigit(2)
 
     def _get_time(self):
-        return list(self.rtc.datetime()[4:7])
+        datetime = self.rtc.datetime()
+        self._subsecond = datetime[7]
+        return list(datetime[4:7])
 
     def focus(self, msg):
         if msg == 0:
@@ -91,12 +99,15 @@ class TimeWindow(Window):
                     timeList[5] = self._numberList[1].getValue()
                     timeList[6] = self._numberList[2].getValue()
                     self.rtc.datetime(tuple(timeList))
+                    self._invalidate_set_field()
                     self._setCount = 0
                     self._setMode = False
                     self.rotary.setEnable(False)
                     self.parant.switch_siganl.emit()
                 else:
+                    self._invalidate_set_field()
                     self._setCount += 1
+                    self._invalidate_set_field()
                     self.rotary.setValueMin(0)
                     self.rotary.setValueMax(59)
                     self.rotary.setValue(self._time[self._setCount])
@@ -105,6 +116,7 @@ class TimeWindow(Window):
                 self.parant.switch_siganl.emit()
         else:
             print('wisget bt pushed', pin, self)
+            self._invalidate_set_field()
             self._setCount = 0
             self._setMode = False
             self.rotary.setEnable(False)
@@ -113,12 +125,30 @@ class TimeWindow(Window):
     def update(self):
         new_time = self._get_time()
         now_time = time.ticks_ms()
-        if time.ticks_diff(now_time, self._last_time) > self.flicker_interval:
-            if self._secCount < 50:
-                self._secCount += 1
-            else:
-                self._secCount = 0
-            self._last_time = now_time
+        # _secCount 每 flicker_interval + 1 毫秒加一，0 - 50 循环
+        step = self.flicker_interval + 1
+        elapsed = time.ticks_diff(now_time, self._last_time)
+        if elapsed >= step * 51:
+            self._last_time = time.ticks_add(self._last_time, elapsed - elapsed % (step * 51))
+            elapsed %= step * 51
+        self._secCount = elapsed // step
+        # 冒号与设置位闪烁切换时标记重绘
+        colon_on = self._secCount < 25
+        if colon_on != self._colon_on:
+            self._colon_on = colon_on
+            self.invalidate(25, 0, 5, 7)
+        field_blank = self._setMode and self._secCount > 35
+        if field_blank != self._field_blank:
+            self._field_blank = field_blank
+            self._invalidate_set_field()
+        # 下一次闪烁切换或下一秒到来时再更新
+        if self._secCount < 25:
+            self.requestUpdate(25 * step - elapsed)
+        elif self._setMode and self._secCount < 36:
+            self.requestUpdate(36 * step - elapsed)
+        else:
+            self.requestUpdate(51 * step - elapsed)
+        self.requestUpdate(1000 - self._subsecond // 1000)
         if not self._setMode:
             if new_time != self._time:
                 self._time = new_time
@@ -126,33 +156,27 @@ class TimeWindow(Window):
                     new_num = new_time[self._numberList.index(num)]
                     if num.getValue() != new_num:
                         num.setValue(str(new_num))
-        else:
+        elif self.rotary.count > 0:
+            # 本轮取出了转动事件时才读取数值
             value = self.rotary.value()
             if self.value_old != value:
                 self._numberList[self._setCount].setValue(str(value))
                 self.value_old = value
 
+    def _invalidate_set_field(self):
+        field = self._numberList[self._setCount]
+        self.invalidate(field.x, field.y, field.w, field.h)
+
     def show(self):
-        colon = self.pbmManager.get_Pbm('colon.pbm')
-        self.buffer.blit(colon.pbmPrint(), 10, 0)
+        colon = self.pbmManager.get(self._colon).pbmPrint()
+        self.buffer.blit(colon, 10, 0)
         if self._secCount < 25:
-            self.buffer.blit(colon.pbmPrint(), 25, 0)
+            self.buffer.blit(colon, 25, 0)
         if self._setMode:
             if self._secCount > 35:
-                self.buffer.fill_rect(self._numberList[self._setCount].x, self._numberList[self._setCount].y,
-                                      self._numberList[self._setCount].w, self._numberList[self._setCount].h, 0)
-        return (self.buffer, self.x, self.y, self.brackGround)
-
-    def gui_show(self):
-        self.buffer.fill(0)
-        widgets = self.widgets
-        if len(widgets) > 0:
-            for widget in widgets:
-                if not widget.hidden:
-                    res = widget.gui_show()
-                    self.buffer.blit(res[0], res[1], res[2], res[3])
-        self.show()
-        return (self.buffer, self.x, self.y, self.brackGround)
+                field = self._numberList[self._setCount]
+                self.invert(field.x, field.y, field.w, field.h)
+        return self.render
 
 
 class SetBrightness(Window):
@@ -167,6 +191,7 @@ class SetBrightness(Window):
         self.rotary.setValueMin(5)
         self.rotary.setValueMax(100)
         self.rotary.setValue(50)
+        self.rotary.setAccel(ROTARY_ACCEL)
         self.value = 50
         self.display = self.getDisplay()
         self.inver_flag = False
@@ -185,6 +210,7 @@ class SetBrightness(Window):
         if msg == 0:
             self.dimLable.hidden = True
             self.inver_flag = True
+            self.invalidate(0, 0, 25, self.h)
             self.rotary.setEnable(True)
             self.old_dim = self.value
         else:
@@ -196,35 +222,35 @@ class SetBrightness(Window):
             self.rotary.setEnable(False)
             self.dimLable.hidden = False
             self.inver_flag = False
+            self.invalidate(0, 0, 25, self.h)
             self.old_dim = self.value
             self.parant.switch_siganl.emit()
             self.parant.back_home()
         elif msg == 1:
             self.rotary.setValue(self.old_dim)
+            self.setValue(self.old_dim)
             self.parant.switch_siganl.emit()
 
     def valueToLum(self, value):
         return round((value / 100) * 240)
 
     def update(self):
-        value = self.rotary.value()
+        # 本轮取出了转动事件时才读取数值
+        if self.rotary.count > 0:
+            self.setValue(self.rotary.value())
+
+    def setValue(self, value):
         if self.value != value:
             self.value = value
             self.numberGroup.setValue(str(self.value))
             self.display.set_display_dimming(self.valueToLum(self.value))
+            if self.inver_flag:
+                self.invalidate(0, 0, 25, self.h)
 
-    def gui_show(self):
-        self.buffer.fill(0)
-        widgets = self.widgets
-        if len(widgets) > 0:
-            for widget in widgets:
-                if not widget.hidden:
-                    res = widget.gui_show()
-                    self.buffer.blit(res[0], res[1], res[2], res[3])
+    def show(self):
         if self.inver_flag:
-            # framebuf_inversion(self.buffer, 0, 0, round(self.value / 100 * 25), self.h)
-            self.buffer.fill_rect(0, 0, round(self.value / 100 * 25), self.h, 1)
-        return (self.buffer, self.x, self.y, self.brackGround)
+            # 整数运算，每帧不分配浮点数
+            self.invert(0, 0, (self.value * 25 + 50) // 100, self.h)
 
 
 class NtpWindow(Window):
@@ -238,28 +264,30 @@ class NtpWindow(Window):
         self.lable = Lable(self, (10, 0, 30, 7), 0.15)
         self.wifi_icon = Animation(self, (0, 0, 7, 7), 200)
         self.wifi_icon.dir = '/ntp'
-        self.down_count = -1
+        # 显示同步结果的时间 (ms)，之后返回主页
+        self.result_time = 2500
+        self._back_time = None
         self.ntp_res = None
         self.wifi_icon.setRange([0, 3])
 
     def setPbmManager(self, pbmManager):
         self.pbmManager = pbmManager
-        pbmManager.add_pbm(Pbm('/ntp/main.pbm'))
-        pbmManager.add_pbm(Pbm('/ntp/ntp.pbm'))
-        pbmManager.add_pbm(Pbm('/ntp/error.pbm'))
-        pbmManager.add_pbm(Pbm('/ntp/ok.pbm'))
-        pbmManager.add_pbm(Pbm('/ntp/wait.pbm'))
+        self._main = pbmManager.add('/ntp/main.pbm')
+        self._ntp = pbmManager.add('/ntp/ntp.pbm')
+        self._error = pbmManager.add('/ntp/error.pbm')
+        self._ok = pbmManager.add('/ntp/ok.pbm')
+        self._wait = pbmManager.add('/ntp/wait.pbm')
         self.wifi_icon.setPbmManager(pbmManager)
         for i in range(0, 4):
-            pbmManager.add_pbm(Pbm('/ntp/%s.pbm' % i))
-        self.lable.setPbm(self.pbmManager.get_Pbm('/ntp/main.pbm'))
+            pbmManager.add('/ntp/%s.pbm' % i)
+        self.lable.setPbmHandle(self.pbmManager, self._main)
 
     def focus(self, msg):
         if msg == 1:
             if self.wlan.isconnected():
                 self.isCheckable = False
-                self.lable.setPbm(self.pbmManager.get_Pbm('/ntp/ntp.pbm'))
-                self._ntptime()
+                self.lable.setPbmHandle(self.pbmManager, self._ntp)
+                self.runTask(self._ntptime)
             else:
                 print('wifi is not connected')
                 self.parant.switch_siganl.emit()
@@ -285,31 +313,24 @@ class NtpWindow(Window):
         self.ntp_flag = 2
 
     def update(self):
-        if self.down_count > 0:
-            self.down_count -= 1
-        elif self.down_count == 0:
-            self.down_count = -1
-            self.lable.setPbm(self.pbmManager.get_Pbm('/ntp/main.pbm'))
-            self.parant.switch_siganl.emit()
-            self.parant.back_home()
+        if self._back_time is not None:
+            remain = time.ticks_diff(self._back_time, time.ticks_ms())
+            if remain > 0:
+                self.requestUpdate(remain)
+            else:
+                self._back_time = None
+                self.lable.setPbmHandle(self.pbmManager, self._main)
+                self.parant.switch_siganl.emit()
+                self.parant.back_home()
         if self.ntp_flag == 2:
             self.ntp_flag = 0
             self.isCheckable = True
-            self.down_count = 250
+            self._back_time = time.ticks_add(time.ticks_ms(), self.result_time)
+            self.requestUpdate(self.result_time)
             if self.ntp_res:
-                self.lable.setPbm(self.pbmManager.get_Pbm('/ntp/ok.pbm'))
+                self.lable.setPbmHandle(self.pbmManager, self._ok)
             else:
-                self.lable.setPbm(self.pbmManager.get_Pbm('/ntp/error.pbm'))
-
-    def gui_show(self):
-        self.buffer.fill(0)
-        widgets = self.widgets
-        if len(widgets) > 0:
-            for widget in widgets:
-                if not widget.hidden:
-                    res = widget.gui_show()
-                    self.buffer.blit(res[0], res[1], res[2], res[3])
-        return (self.buffer, self.x, self.y, self.brackGround)
+                self.lable.setPbmHandle(self.pbmManager, self._error)
 
 
 class WifiWindow(Window):
@@ -323,32 +344,34 @@ class WifiWindow(Window):
         self.lable = Lable(self, (0, 0, 25, 7), 0.15)
         self.wifi_button = ScreenButton(self, (25, 0, 15, 7), 30)
         self.wifi_button.dir = '/wifi'
-        self.down_count = -1
+        # 轮询连接状态的间隔 (ms)
+        self.poll_interval = 500
         self.wifi_button.setRange([0, 6])
 
     def setPbmManager(self, pbmManager):
         self.pbmManager = pbmManager
-        pbmManager.add_pbm(Pbm('/wifi/main.pbm'))
-        pbmManager.add_pbm(Pbm('/wifi/error.pbm'))
-        pbmManager.add_pbm(Pbm('/wifi/ok.pbm'))
-        pbmManager.add_pbm(Pbm('/wifi/wait.pbm'))
+        self._main = pbmManager.add('/wifi/main.pbm')
+        self._error = pbmManager.add('/wifi/error.pbm')
+        self._ok = pbmManager.add('/wifi/ok.pbm')
+        self._wait = pbmManager.add('/wifi/wait.pbm')
         self.wifi_button.setPbmManager(pbmManager)
         for i in range(0, 7):
-            pbmManager.add_pbm(Pbm('/wifi/on/%s.pbm' % i))
-            pbmManager.add_pbm(Pbm('/wifi/off/%s.pbm' % i))
-        self.lable.setPbm(self.pbmManager.get_Pbm('/wifi/main.pbm'))
+            pbmManager.add('/wifi/on/%s.pbm' % i)
+            pbmManager.add('/wifi/off/%s.pbm' % i)
+        self.lable.setPbmHandle(self.pbmManager, self._main)
 
     def focus(self, msg):
         if msg == 0:
             if not self.wlan.isconnected() and not self.connect_flag:
                 self.i = 0
-                self.lable.setPbm(self.pbmManager.get_Pbm('/wifi/wait.pbm'))
+                self.lable.setPbmHandle(self.pbmManager, self._wait)
                 self.wifi_button.setState(True)
                 self.connect_flag = True
-                self.do_connect('Reboot93--2.4G', 'LOVELIVEsaiko93')
+                self.runTask(self.do_connect, 'Reboot93--2.4G', 'LOVELIVEsaiko93')
             elif self.wlan.isconnected() and self.connect_flag:
                 self.wifi_button.setState(False)
-                self.dis_connect()
+                self.lable.setPbmHandle(self.pbmManager, self._main)
+                self.runTask(self.dis_connect)
                 self.i = 0
             self.parant.switch_siganl.emit()
         else:
@@ -376,27 +399,17 @@ class WifiWindow(Window):
         if self.wlan.isconnected() and self.i == 0:
             print('network config:', self.wlan.ifconfig())
             self.i += 1
-            self.lable.setPbm(self.pbmManager.get_Pbm('/wifi/main.pbm'))
+            # 连接成功后显示 IP 地址
+            self.lable.setText(self.wlan.ifconfig()[0])
         if not self.i == 0:
             self.wifi_button.setState(self.wlan.isconnected())
-
-    def gui_show(self):
-        self.buffer.fill(0)
-        widgets = self.widgets
-        if len(widgets) > 0:
-            for widget in widgets:
-                if not widget.hidden:
-                    res = widget.gui_show()
-                    self.buffer.blit(res[0], res[1], res[2], res[3])
-        return (self.buffer, self.x, self.y, self.brackGround)
+        self.requestUpdate(self.poll_interval)
 
 
 class YeelightSetBrightness(Window):
 
     def __init__(self, parant, window_info, insert=None, loc="Top"):
         super().__init__(parant, window_info, insert, loc)
-        self.infoSignal = Signal()
-        self.infoSignal.connect(self.init)
         self.pbmManager = None
         self.isCheckable = True
         self.rotary = Rotary(21, 22)
@@ -405,6 +418,7 @@ class YeelightSetBrightness(Window):
         self.rotary.setValueMin(1)
         self.rotary.setValueMax(100)
         self.rotary.setValue(50)
+        self.rotary.setAccel(ROTARY_ACCEL)
         self.value = 50
         self.numberGroup = NumberGroup(self, (25, 0, 15, 7), 0.7)
         self.lable = Lable(self, (0, 0, 25, 7), 0.2)
@@ -417,8 +431,8 @@ class YeelightSetBrightness(Window):
         self.numberGroup.setDigit(3)
         self.numberGroup.setValue(str(self.value))
 
-    def init(self):
-        info = self.parant.blub.get_properties()
+    async def init(self):
+        info = await self.parant.blub.get_properties_async()
         print(info)
         if type(info) == dict:
             self.value = int(info['bright'])
@@ -435,42 +449,33 @@ class YeelightSetBrightness(Window):
     def buttonCallback(self, pin, msg):
         if msg == 0:
             print('wisget bt pushed', pin, self)
-            self.parant.blub.set_brightness(self.value)
+            self.runTask(self.parant.blub.set_brightness_async, self.value)
             self.rotary.setEnable(False)
             self.parant.switch_siganl.emit()
             self.parant.back_home()
         elif msg == 1:
             self.rotary.setValue(self.old_brightness)
+            self.value = self.old_brightness
             self.numberGroup.setValue(str(self.old_brightness))
-            self.parant.blub.set_brightness(self.old_brightness)
+            self.runTask(self.parant.blub.set_brightness_async, self.old_brightness)
             self.rotary.setEnable(False)
             self.parant.switch_siganl.emit()
             self.parant.back_home()
 
     def update(self):
+        if self.rotary.count == 0:
+            return
         value = self.rotary.value()
         if self.value != value:
             self.value = value
             self.numberGroup.setValue(str(self.value))
             # self.parant.blub.set_brightness(self.value)
 
-    def gui_show(self):
-        self.buffer.fill(0)
-        widgets = self.widgets
-        if len(widgets) > 0:
-            for widget in widgets:
-                if not widget.hidden:
-                    res = widget.gui_show()
-                    self.buffer.blit(res[0], res[1], res[2], res[3])
-        return (self.buffer, self.x, self.y, self.brackGround)
-
 
 class YeelightSetColorTemperature(Window):
 
     def __init__(self, parant, window_info, insert=None, loc="Top"):
         super().__init__(parant, window_info, insert, loc)
-        self.infoSignal = Signal()
-        self.infoSignal.connect(self.init)
         self.pbmManager = None
         self.isCheckable = True
         self.rotary = Rotary(21, 22)
@@ -480,6 +485,7 @@ class YeelightSetColorTemperature(Window):
         self.rotary.setValueMin(2700)
         self.rotary.setValueMax(6500)
         self.rotary.setValue(6500)
+        self.rotary.setAccel(ROTARY_ACCEL)
         self.value = 6500
         self.numberGroup = NumberGroup(self, (20, 0, 20, 7), 0.7)
         self.lable = Lable(self, (0, 0, 20, 7), 0.2)
@@ -492,8 +498,8 @@ class YeelightSetColorTemperature(Window):
         self.numberGroup.setDigit(4)
         self.numberGroup.setValue(str(self.value))
 
-    def init(self):
-        info = self.parant.blub.get_properties()
+    async def init(self):
+        info = await self.parant.blub.get_properties_async()
         print(info)
         if type(info) == dict:
             self.value = int(info['ct'])
@@ -510,34 +516,27 @@ class YeelightSetColorTemperature(Window):
     def buttonCallback(self, pin, msg):
         if msg == 0:
             print('wisget bt pushed', pin, self)
-            self.parant.blub.change_color_temperature(self.value)
+            self.runTask(self.parant.blub.change_color_temperature_async, self.value)
             self.rotary.setEnable(False)
             self.parant.switch_siganl.emit()
             self.parant.back_home()
         elif msg == 1:
             self.rotary.setValue(self.old_ct)
+            self.value = self.old_ct
             self.numberGroup.setValue(str(self.old_ct))
-            self.parant.blub.change_color_temperature(self.old_ct)
+            self.runTask(self.parant.blub.change_color_temperature_async, self.old_ct)
             self.rotary.setEnable(False)
             self.parant.switch_siganl.emit()
             self.parant.back_home()
 
     def update(self):
+        if self.rotary.count == 0:
+            return
         value = self.rotary.value()
         if self.value != value:
             self.value = value
             self.numberGroup.setValue(str(self.value))
 
-    def gui_show(self):
-        self.buffer.fill(0)
-        widgets = self.widgets
-        if len(widgets) > 0:
-            for widget in widgets:
-                if not widget.hidden:
-                    res = widget.gui_show()
-                    self.buffer.blit(res[0], res[1], res[2], res[3])
-        return (self.buffer, self.x, self.y, self.brackGround)
-
 
 class YeelightView(RotaryViewPager):
 
@@ -557,8 +556,8 @@ class YeelightView(RotaryViewPager):
                 self.rotary.setEnable(True)
                 self.blub = yeelight.Bulb('192.168.6.246')
                 self.setWidget(1)
-                self.window_2.infoSignal.emit()
-                self.window_3.infoSignal.emit()
+                self.runTask(self.window_2.init)
+                self.runTask(self.window_3.init)
             else:
                 print(self, 'wlan not connected')
                 self.parant.switch_siganl.emit()
@@ -15,12 +15,18 @@ setValueMax(value):
 setValueMin(value):
 setRangeMode(mode):
 setIncr(incr):
+load(value, min_val, max_val, incr, range_mode, accel=None):
+setAccel(curve):
 reset(num)
 enable():
+read(deltas, times):
+flush():
 '''
 
 
 import micropython
+from array import array
+from time import ticks_us, ticks_diff
 
 _DIR_CW = const(0x10)  # Clockwise step
 _DIR_CCW = const(0x20)  # Counter-clockwise step
@@ -35,51 +41,45 @@ _R_CCW_2 = const(0x5)
 _R_CCW_3 = const(0x6)
 _R_ILLEGAL = const(0x7)
 
-_transition_table = [
+# Both transition tables flattened into one bytes object so the interrupt handler
+# does a single index: next = _transitions[table + ((state & _STATE_MASK) << 2) + clk_dt]
+# table is 0 for full step and _HALF_STEP for half step decoding
+_HALF_STEP = const(32)
+
+_transitions = bytes((
 
     # |------------- NEXT STATE -------------|            |CURRENT STATE|
     # CLK/DT    CLK/DT     CLK/DT    CLK/DT
     #   00        01         10        11
-    [_R_START, _R_CCW_1, _R_CW_1, _R_START],  # _R_START
-    [_R_CW_2, _R_START, _R_CW_1, _R_START],  # _R_CW_1
-    [_R_CW_2, _R_CW_3, _R_CW_1, _R_START],  # _R_CW_2
-    [_R_CW_2, _R_CW_3, _R_START, _R_START | _DIR_CW],  # _R_CW_3
-    [_R_CCW_2, _R_CCW_1, _R_START, _R_START],  # _R_CCW_1
-    [_R_CCW_2, _R_CCW_1, _R_CCW_3, _R_START],  # _R_CCW_2
-    [_R_CCW_2, _R_START, _R_CCW_3, _R_START | _DIR_CCW],  # _R_CCW_3
-    [_R_START, _R_START, _R_START, _R_START]]  # _R_ILLEGAL
-
-_transition_table_half_step = [
-    [_R_CW_3, _R_CW_2, _R_CW_1, _R_START],
-    [_R_CW_3 | _DIR_CCW, _R_START, _R_CW_1, _R_START],
-    [_R_CW_3 | _DIR_CW, _R_CW_2, _R_START, _R_START],
-    [_R_CW_3, _R_CCW_2, _R_CCW_1, _R_START],
-    [_R_CW_3, _R_CW_2, _R_CCW_1, _R_START | _DIR_CW],
-    [_R_CW_3, _R_CCW_2, _R_CW_3, _R_START | _DIR_CCW],
-    [_R_START, _R_START, _R_START, _R_START],
-    [_R_START, _R_START, _R_START, _R_START]]
+    _R_START, _R_CCW_1, _R_CW_1, _R_START,  # _R_START
+    _R_CW_2, _R_START, _R_CW_1, _R_START,  # _R_CW_1
+    _R_CW_2, _R_CW_3, _R_CW_1, _R_START,  # _R_CW_2
+    _R_CW_2, _R_CW_3, _R_START, _R_START | _DIR_CW,  # _R_CW_3
+    _R_CCW_2, _R_CCW_1, _R_START, _R_START,  # _R_CCW_1
+    _R_CCW_2, _R_CCW_1, _R_CCW_3, _R_START,  # _R_CCW_2
+    _R_CCW_2, _R_START, _R_CCW_3, _R_START | _DIR_CCW,  # _R_CCW_3
+    _R_START, _R_START, _R_START, _R_START,  # _R_ILLEGAL
+
+    # half step
+    _R_CW_3, _R_CW_2, _R_CW_1, _R_START,
+    _R_CW_3 | _DIR_CCW, _R_START, _R_CW_1, _R_START,
+    _R_CW_3 | _DIR_CW, _R_CW_2, _R_START, _R_START,
+    _R_CW_3, _R_CCW_2, _R_CCW_1, _R_START,
+    _R_CW_3, _R_CW_2, _R_CCW_1, _R_START | _DIR_CW,
+    _R_CW_3, _R_CCW_2, _R_CW_3, _R_START | _DIR_CCW,
+    _R_START, _R_START, _R_START, _R_START,
+    _R_START, _R_START, _R_START, _R_START))
 
 _STATE_MASK = const(0x07)
 _DIR_MASK = const(0x30)
 
+# Same values as Rotary.RANGE_WRAP / RANGE_BOUNDED, for the interrupt handler
+_RANGE_WRAP = const(2)
+_RANGE_BOUNDED = const(3)
 
-def _wrap(value, incr, lower_bound, upper_bound):
-    range = upper_bound - lower_bound + 1
-    value = value + incr
-
-    if value < lower_bound:
-        value += range * ((lower_bound - value) // range + 1)
-
-    return lower_bound + (value - lower_bound) % range
-
-
-def _bound(value, incr, lower_bound, upper_bound):
-    return min(upper_bound, max(lower_bound, value + incr))
-
-
-def _trigger(rotary_instance):
-    for listener in rotary_instance._listener:
-        listener()
+# Size of the step event ring buffer, must be a power of two
+_EVENTS = const(32)
+_EVENTS_MASK = const(_EVENTS - 1)
 
 
 class Rotary(object):
@@ -96,8 +96,26 @@ class Rotary(object):
         self._value = min_val
         self._state = _R_START
         self._half_step = half_step
+        self._table = _HALF_STEP if half_step else 0
         self._invert = invert
         self._listener = []
+        # Acceleration curve, see setAccel()
+        self._accel = None
+        self._last_step = 0
+        self._last_time = 0
+        # Step events (+1 / -1 after reverse, ticks_us) written by the pin interrupt and
+        # drained by read() outside of it. Only the interrupt moves _ev_head and only
+        # read() / flush() move _ev_tail, so no locking is needed
+        self._ev_delta = array('h', bytes(2 * _EVENTS))
+        self._ev_time = array('L', [0] * _EVENTS)
+        self._ev_head = 0
+        self._ev_tail = 0
+        # Events merged into the newest one because the buffer was full
+        self.overflows = 0
+        # Listeners run through micropython.schedule(), at most one pending at a time.
+        # The bound method is created here because the interrupt must not allocate
+        self._scheduled = False
+        self._dispatch_ref = self._dispatch
 
     def set(self, value=None, min_val=None, incr=None,
             max_val=None, reverse=None, range_mode=None):
@@ -139,6 +157,24 @@ class Rotary(object):
     def setIncr(self, incr: int):
         self._incr = abs(incr)
 
+    # Replace the value and range settings at once, used to switch between input
+    # profiles without reconfiguring the pin interrupts like set() does
+    def load(self, value, min_val, max_val, incr, range_mode, accel=None):
+        self._value = value
+        self._min_val = min_val
+        self._max_val = max_val
+        self._incr = abs(incr)
+        self._range_mode = range_mode
+        self._accel = accel
+
+    # curve is an array of (interval_us, multiplier) pairs flattened, intervals in
+    # decreasing order. A step that follows the previous one in the same direction
+    # within interval_us is multiplied by that multiplier, the last matching pair wins.
+    # Slower steps and the first step after a direction change move by exactly incr.
+    # None turns acceleration off
+    def setAccel(self, curve):
+        self._accel = curve
+
     def reset(self, num=0):
         self._value = num
 
@@ -148,6 +184,26 @@ class Rotary(object):
     def close(self):
         self._hal_close()
 
+    # Copy pending step events into the deltas / times arrays, return the count
+    # In RANGE_BOUNDED mode steps clamped at min / max are not recorded
+    def read(self, deltas, times):
+        tail = self._ev_tail
+        head = self._ev_head
+        n = 0
+        size = len(deltas)
+        while tail != head and n < size:
+            deltas[n] = self._ev_delta[tail]
+            times[n] = self._ev_time[tail]
+            tail = (tail + 1) & _EVENTS_MASK
+            n += 1
+        self._ev_tail = tail
+        return n
+
+    # Drop pending step events
+    def flush(self):
+        self._ev_tail = self._ev_head
+
+    # Listeners are called once per batch of steps, outside of interrupt context
     def add_listener(self, l):
         self._listener.append(l)
 
@@ -156,48 +212,81 @@ class Rotary(object):
             raise ValueError('{} is not an installed listener'.format(l))
         self._listener.remove(l)
 
+    def _dispatch(self, arg):
+        self._scheduled = False
+        for listener in self._listener:
+            listener()
+
+    # Pin interrupt handler: integer-only, no allocation, no Python callbacks
+    @micropython.native
     def _process_rotary_pins(self, pin):
-        old_value = self._value
-        clk_dt_pins = (self._hal_get_clk_value() <<
-                       1) | self._hal_get_dt_value()
+        clk_dt_pins = (self._hal_get_clk_value() << 1) | self._hal_get_dt_value()
 
         if self._invert:
             clk_dt_pins = ~clk_dt_pins & 0x03
 
         # Determine next state
-        if self._half_step:
-            self._state = _transition_table_half_step[self._state &
-                                                      _STATE_MASK][clk_dt_pins]
-        else:
-            self._state = _transition_table[self._state &
-                                            _STATE_MASK][clk_dt_pins]
-        direction = self._state & _DIR_MASK
+        state = _transitions[self._table + ((self._state & _STATE_MASK) << 2) + clk_dt_pins]
+        self._state = state
+        direction = state & _DIR_MASK
 
-        incr = 0
         if direction == _DIR_CW:
-            incr = self._incr
+            step = self._reverse
         elif direction == _DIR_CCW:
-            incr = -self._incr
-
-        incr *= self._reverse
-
-        if self._range_mode == self.RANGE_WRAP:
-            self._value = _wrap(
-                self._value,
-                incr,
-                self._min_val,
-                self._max_val)
-        elif self._range_mode == self.RANGE_BOUNDED:
-            self._value = _bound(
-                self._value,
-                incr,
-                self._min_val,
-                self._max_val)
+            step = -self._reverse
         else:
-            self._value = self._value + incr
+            return
+
+        incr = step * self._incr
+        now = ticks_us()
+        curve = self._accel
+        if curve is not None and step == self._last_step:
+            interval = ticks_diff(now, self._last_time)
+            multiplier = 1
+            i = 0
+            n = len(curve)
+            while i < n and interval < curve[i]:
+                multiplier = curve[i + 1]
+                i += 2
+            incr *= multiplier
+        self._last_step = step
+        self._last_time = now
+
+        value = self._value + incr
+        mode = self._range_mode
+        if mode == _RANGE_WRAP:
+            low = self._min_val
+            high = self._max_val
+            if value < low or value > high:
+                value = low + (value - low) % (high - low + 1)
+        elif mode == _RANGE_BOUNDED:
+            if value < self._min_val:
+                value = self._min_val
+            elif value > self._max_val:
+                value = self._max_val
+            if value == self._value:
+                # Clamped at a bound: no event and no listener call, like a turn that did nothing
+                return
+        self._value = value
 
-        try:
-            if old_value != self._value and len(self._listener) != 0:
-                _trigger(self)
-        except:
-            pass
+        head = self._ev_head
+        if (head + 1) & _EVENTS_MASK == self._ev_tail:
+            # Buffer full: add the step to the newest event so no step is lost
+            head = (head - 1) & _EVENTS_MASK
+            delta = self._ev_delta[head] + step
+            if -32768 < delta < 32768:
+                self._ev_delta[head] = delta
+            self._ev_time[head] = now
+            self.overflows += 1
+        else:
+            self._ev_delta[head] = step
+            self._ev_time[head] = now
+            self._ev_head = (head + 1) & _EVENTS_MASK
+
+        if not self._scheduled and self._listener:
+            self._scheduled = True
+            try:
+                micropython.schedule(self._dispatch_ref, 0)
+            except RuntimeError:
+                # schedule queue full, retry on the next step
+                self._scheduled = False
@@ -255,15 +255,18 @@ class Bulb():
         return self._handle_response(self._send_message("set_name",
                                                         [name]))
 
-    def _send_message(self, method, params=None):
+    def _build_message(self, method, params=None):
         if params is None:
             params = []
 
         self.cmd_id += 1
 
-        message = '{{"id": {id}, "method": "{method}", "params": {params}}}\r\n'. \
+        return '{{"id": {id}, "method": "{method}", "params": {params}}}\r\n'. \
             format(id=self.cmd_id, method=method, params=json.dumps(params))
 
+    def _send_message(self, method, params=None):
+        message = self._build_message(method, params)
+
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
         try:
@@ -291,3 +294,43 @@ class Bulb():
             raise YeeLightException(response["error"])
         else:
             raise YeeLightException("Unknown Exception occurred.")
+
+    """ asyncio versions: the socket I/O yields to other tasks instead of blocking """
+
+    async def _send_message_async(self, method, params=None):
+        try:
+            import uasyncio as asyncio
+        except ImportError:
+            import asyncio
+
+        message = self._build_message(method, params)
+
+        reader, writer = await asyncio.open_connection(self.get_ip, self.get_port)
+        try:
+            writer.write(message.encode())
+            await writer.drain()
+            recv_data = await reader.read(1024)
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+        return recv_data
+
+    async def request_async(self, method, params=None):
+        return self._handle_response(await self._send_message_async(method, params))
+
+    async def set_brightness_async(self, brightness, effect=EFFECT.SUDDEN, duration=30):
+        return await self.request_async("set_bright", [brightness, effect, duration])
+
+    async def change_color_temperature_async(self, color_temp_val, effect=EFFECT.SUDDEN, duration=30):
+        return await self.request_async("set_ct_abx", [color_temp_val, effect, duration])
+
+    async def get_properties_async(self, requested_properties=('power', 'bright', 'ct', 'name')):
+        try:
+            res = await self.request_async("get_prop", list(requested_properties))
+            properties = {}
+            for count in range(len(res)):
+                properties[requested_properties[count]] = res[count]
+            return properties
+        except:
+            return -1